@@ -0,0 +1,404 @@
+"""
+Engine benchmark suite - no network, no live data.
+
+Times the hot paths on deterministic synthetic OHLCV (1y-30y of daily bars,
+several symbols) and a synthetic option-chain snapshot, and checks every
+result against bench_golden.json:
+  - digest mismatch            -> FAIL (the optimization changed the output)
+  - median slower than baseline by more than --threshold -> SLOW
+
+Cases whose API predates the optimizations (ma_strategy/*, backtest/*,
+vol_backtest/*) are recorded from the pre-optimization engines at a git
+revision (--baseline), so the check shows the speed-up over them and that
+output is unchanged on every field the baseline returned (keys added since,
+at any depth, are ignored). The other cases have no baseline equivalent and
+are recorded from the working tree.
+
+    python bench_engine.py                            # compare with the golden file
+    python bench_engine.py --update --baseline aefa034 # record baseline + current entries
+    python bench_engine.py --update                   # re-record current entries only
+    python bench_engine.py --quick -k backtest
+
+Timing baselines are machine specific: re-record them with --update on the
+machine you compare on (digests are not, floats are hashed at 10 digits).
+"""
+import os
+import sys
+import json
+import time
+import zlib
+import shutil
+import hashlib
+import asyncio
+import subprocess
+import importlib.util
+import argparse
+import platform
+import tempfile
+import statistics
+from functools import lru_cache
+
+# --- ISOLATION ---
+# Before core is imported: throwaway db / option snapshots, no shared cache,
+# no background poller or warm-up, so nothing touches data/ or the network.
+BENCH_DIR = tempfile.mkdtemp(prefix="wealth_os_bench_")
+os.environ.update({
+    "WEALTH_OS_DB": os.path.join(BENCH_DIR, "wealth_os.db"),
+    "WEALTH_OS_OPTIONS_DIR": os.path.join(BENCH_DIR, "options"),
+    "WEALTH_OS_SHARED_CACHE": "0",
+    "WEALTH_OS_POLLER": "0",
+    "WEALTH_OS_WARMUP": "0",
+})
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+import pandas as pd
+from core.pricing import bs_price
+from core.engine import calculate_ma_strategy, run_backtest_simulation
+from core.options_engine import run_vol_backtest
+from core.fetcher import fetch_options_summary
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+GOLDEN_FILE = os.path.join(BACKEND_DIR, "bench_golden.json")
+DEFAULT_THRESHOLD = 0.25   # flag medians more than 25% over baseline
+MIN_DELTA_MS = 0.2         # ... and more than this in absolute terms (timer noise)
+FLOAT_DIGITS = 10          # significant digits hashed (SIMD exp/log differ in the last ulp across CPUs)
+
+END_DATE = "2025-12-31"
+# vol_backtest/* ends before the option snapshots (last 12 month ends to END_DATE),
+# so it prices on HV like the baseline; vol_backtest_surface covers the snapshot path
+VOL_END_DATE = "2024-06-28"
+YEARS = (1, 5, 10, 30)
+QUICK_YEARS = (1, 10)
+PORTFOLIO_SIZE = 50
+
+# symbol: (start price, annual drift, base annual volatility)
+SYMBOLS = {
+    "0050.TW": (35.0, 0.08, 0.18),
+    "00631L.TW": (20.0, 0.14, 0.36),
+    "^TWII": (6000.0, 0.06, 0.17),
+    "TQQQ": (5.0, 0.20, 0.60),
+}
+
+# --- SYNTHETIC DATA ---
+
+@lru_cache(maxsize=None)
+def synthetic_ohlcv(symbol: str, years: int, end: str = END_DATE, tz: str = "Asia/Taipei") -> pd.DataFrame:
+    """
+    Daily OHLCV ending on `end`, seeded from (symbol, years): the same call
+    gives the same bars on every run. GBM closes with a mean-reverting
+    log-volatility regime (so HV filters see calm and stressed spells).
+    """
+    start_price, drift, vol = SYMBOLS[symbol]
+    n = years * 252
+    rng = np.random.default_rng(zlib.crc32(f"{symbol}:{years}".encode()))
+
+    regime = np.empty(n)
+    regime[0] = 0.0
+    shocks = rng.normal(0, 0.08, n)
+    for i in range(1, n):
+        regime[i] = 0.98 * regime[i - 1] + shocks[i]
+    daily_vol = vol * np.exp(regime) / np.sqrt(252)
+
+    log_ret = (drift / 252 - daily_vol ** 2 / 2) + daily_vol * rng.normal(0, 1, n)
+    close = start_price * np.exp(np.cumsum(log_ret))
+    prev = np.concatenate(([start_price], close[:-1]))
+    open_ = prev * np.exp(daily_vol * rng.normal(0, 0.3, n))
+    high = np.maximum(open_, close) * (1 + daily_vol * np.abs(rng.normal(0, 0.5, n)))
+    low = np.minimum(open_, close) * (1 - daily_vol * np.abs(rng.normal(0, 0.5, n)))
+    volume = rng.integers(100_000, 10_000_000, n)
+
+    index = pd.bdate_range(end=end, periods=n, tz=tz, name="Date")
+    return pd.DataFrame({"Open": open_, "High": high, "Low": low, "Close": close, "Volume": volume}, index=index)
+
+def write_option_snapshot(index_df: pd.DataFrame, path: str, dates: int = 12):
+    """
+    TXO chain CSV (English columns, see core.volsurface) for the last `dates`
+    month ends of an index history: puts and calls every 100 points around
+    spot, weekly and monthly expiries, settled off a skewed smile.
+    """
+    r = 0.015
+    rows = []
+    month_ends = index_df['Close'].groupby(index_df.index.tz_localize(None).to_period('M')).tail(1).iloc[-dates:]
+    for stamp, spot in month_ends.items():
+        date = stamp.tz_localize(None).normalize()
+        strikes = np.arange(round(spot / 100) * 100 - 2000, round(spot / 100) * 100 + 2001, 100)
+        for days in (7, 30):
+            m = np.log(strikes / spot)
+            iv = 0.18 - 0.25 * m + 1.5 * m ** 2
+            for is_call, label in ((True, "call"), (False, "put")):
+                price = bs_price(spot, strikes, days / 365, r, iv, is_call=is_call)
+                for k, p in zip(strikes.tolist(), np.round(price, 1).tolist()):
+                    rows.append({
+                        "date": date.strftime("%Y/%m/%d"),
+                        "contract": "TXO",
+                        "expiry": (date + pd.Timedelta(days=days)).strftime("%Y-%m-%d"),
+                        "strike": k,
+                        "type": label,
+                        "settle": p,
+                        "session": "regular",
+                        "underlying": round(float(spot), 2),
+                    })
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    pd.DataFrame(rows).to_csv(path, index=False)
+
+def synthetic_positions(n: int = PORTFOLIO_SIZE) -> list:
+    rng = np.random.default_rng(zlib.crc32(b"portfolio"))
+    positions = [{"id": f"pos-{i:03d}", "symbol": f"{2300 + i}.TW", "shares": int(rng.integers(1, 50)) * 1000,
+                  "avg_cost": round(float(rng.uniform(20, 800)), 2), "created_at": "2025-01-01T00:00:00"} for i in range(n - 2)]
+    positions.append({"id": "pos-mtx", "symbol": "MTX", "shares": 2, "avg_cost": 22000.0, "created_at": "2025-01-01T00:00:00"})
+    positions.append({"id": "pos-cash", "symbol": "CASH", "shares": 500000, "avg_cost": 1, "created_at": "2025-01-01T00:00:00"})
+    return positions
+
+def synthetic_quote(symbol: str) -> dict:
+    """Deterministic {price, prev_close} per symbol, shaped like core.quotes."""
+    rng = np.random.default_rng(zlib.crc32(symbol.encode()))
+    prev_close = 22500.0 if symbol == "MTX" else round(float(rng.uniform(20, 800)), 2)
+    price = round(prev_close * (1 + float(rng.normal(0, 0.015))), 2)
+    return {"symbol": symbol, "price": price, "prev_close": prev_close, "source": "bench"}
+
+# --- STUBBED FETCHER ---
+
+async def stub_quote(symbol: str, refresh: bool = False):
+    return synthetic_quote(symbol)
+
+async def stub_price_history(symbol: str, period: str = "1y", **kwargs):
+    key = symbol.upper() if symbol.upper() in SYMBOLS else "0050.TW"
+    return synthetic_ohlcv(key, 10)
+
+# --- CASES ---
+
+def build_cases(years: tuple) -> dict:
+    """name -> zero-argument callable returning the result to check."""
+    cases = {}
+    for n in years:
+        for symbol in ("0050.TW", "TQQQ"):
+            cases[f"ma_strategy/{symbol}/{n}y"] = lambda s=symbol, n=n: calculate_ma_strategy(synthetic_ohlcv(s, n))
+        for strategy in ("ma_trend", "buy_hold"):
+            cases[f"backtest/{strategy}/{n}y"] = lambda st=strategy, n=n: run_backtest_simulation(
+                synthetic_ohlcv("00631L.TW", n), strategy_type=st, leverage=1.0,
+                benchmark_df=synthetic_ohlcv("0050.TW", n))
+        cases[f"vol_backtest/^TWII/{n}y"] = lambda n=n: run_vol_backtest(synthetic_ohlcv("^TWII", n, VOL_END_DATE))
+
+    n = max(years)
+    cases[f"vol_backtest_surface/^TWII/{n}y"] = lambda: run_vol_backtest(synthetic_ohlcv("^TWII", n))
+    # Incremental path: symbol state already seeded, same frame again (monitor refresh)
+    cases[f"ma_strategy_live/0050.TW/{n}y"] = lambda: calculate_ma_strategy(synthetic_ohlcv("0050.TW", n), symbol="BENCH:0050.TW")
+    cases[f"backtest_analytics/{n}y"] = lambda: run_backtest_simulation(
+        synthetic_ohlcv("00631L.TW", n), strategy_type="ma_trend", leverage=2.0, columnar=True, analytics=True,
+        benchmarks={"0050.TW": synthetic_ohlcv("0050.TW", n), "^TWII": synthetic_ohlcv("^TWII", n)})
+    # US listing (New York midnight bars) against a .TW strategy: aligned on trading date
+    cases[f"backtest_us_benchmark/{n}y"] = lambda: run_backtest_simulation(
+        synthetic_ohlcv("00631L.TW", n), strategy_type="ma_trend", leverage=1.0, symbol="BENCH:00631L.TW",
+        benchmarks={"TQQQ": synthetic_ohlcv("TQQQ", n, tz="America/New_York")})
+
+    loop = asyncio.new_event_loop()
+    index_price = float(synthetic_ohlcv("^TWII", 10)['Close'].iloc[-1])
+    cases["options_summary"] = lambda: loop.run_until_complete(fetch_options_summary(index_price))
+
+    client, positions = portfolio_client(), synthetic_positions()
+    cases[f"portfolio_enrich/{PORTFOLIO_SIZE}"] = lambda: client.post("/api/portfolio", json=positions).json()
+    return cases
+
+def load_baseline_module(revision: str, name: str):
+    """core/<name>.py as of a git revision, imported standalone (engine / options_engine only need numpy / pandas)."""
+    source = subprocess.run(["git", "show", f"{revision}:backend/core/{name}.py"], cwd=BACKEND_DIR,
+                            check=True, capture_output=True, text=True).stdout
+    path = os.path.join(BENCH_DIR, f"baseline_{name}.py")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(source)
+    spec = importlib.util.spec_from_file_location(f"baseline_{name}", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def build_baseline_cases(years: tuple, revision: str) -> dict:
+    """
+    The cases whose call is unchanged since the baseline, run on the baseline
+    engines. They add indicator columns to their input, so each call gets a fresh
+    copy (as it did from the fetcher) and the shared synthetic frames stay clean.
+    """
+    engine = load_baseline_module(revision, "engine")
+    options_engine = load_baseline_module(revision, "options_engine")
+    cases = {}
+    for n in years:
+        for symbol in ("0050.TW", "TQQQ"):
+            cases[f"ma_strategy/{symbol}/{n}y"] = lambda s=symbol, n=n: engine.calculate_ma_strategy(synthetic_ohlcv(s, n).copy())
+        for strategy in ("ma_trend", "buy_hold"):
+            cases[f"backtest/{strategy}/{n}y"] = lambda st=strategy, n=n: engine.run_backtest_simulation(
+                synthetic_ohlcv("00631L.TW", n).copy(), strategy_type=st, leverage=1.0,
+                benchmark_df=synthetic_ohlcv("0050.TW", n).copy())
+        cases[f"vol_backtest/^TWII/{n}y"] = lambda n=n: options_engine.run_vol_backtest(synthetic_ohlcv("^TWII", n, VOL_END_DATE).copy())
+    return cases
+
+def portfolio_client():
+    """TestClient on the real app with quotes / history served by the stubs."""
+    from fastapi.testclient import TestClient
+    import main
+    main.fetch_quote = stub_quote
+    main.fetch_price_history = stub_price_history
+    return TestClient(main.app)
+
+# --- GOLDEN RESULTS ---
+
+def _plain(value):
+    """JSON-safe, order-independent form of an engine result."""
+    if isinstance(value, dict):
+        return {str(k): _plain(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_plain(v) for v in value]
+    if isinstance(value, np.ndarray):
+        return [_plain(v) for v in value.tolist()]
+    if isinstance(value, np.generic):
+        return _plain(value.item())
+    if isinstance(value, float):
+        if not np.isfinite(value):
+            return str(value)
+        value = float(f"{value:.{FLOAT_DIGITS}g}")
+        # 100000.0 and 100000 hash alike (the baseline returned some ints as floats and vice versa)
+        return int(value) if value.is_integer() and abs(value) < 2 ** 53 else value
+    if isinstance(value, (pd.Timestamp, pd.Timedelta)):
+        return str(value)
+    return value
+
+def _merge_schema(a, b):
+    if isinstance(a, dict) and isinstance(b, dict):
+        return {k: _merge_schema(a.get(k), b.get(k)) for k in {**a, **b}}
+    if isinstance(a, list) and isinstance(b, list):
+        return [_merge_schema(a[0], b[0])]
+    return a if a is not None else b
+
+def schema(value):
+    """Key structure of a result: dicts by key, lists of dicts by the union of their elements' keys."""
+    if isinstance(value, dict):
+        return {str(k): schema(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)) and value and all(isinstance(v, dict) for v in value):
+        merged = {}
+        for v in value:
+            merged = _merge_schema(merged, schema(v))
+        return [merged]
+    return None
+
+def project(value, shape):
+    """`value` restricted to the keys in `shape` (see schema)."""
+    if isinstance(shape, dict) and isinstance(value, dict):
+        return {k: project(value[k], s) for k, s in shape.items() if k in value}
+    if isinstance(shape, list) and isinstance(value, (list, tuple)):
+        return [project(v, shape[0]) for v in value]
+    return value
+
+def digest(result) -> str:
+    text = json.dumps(_plain(result), sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.blake2b(text.encode(), digest_size=16).hexdigest()
+
+def summary(result) -> dict:
+    """A few scalars to show next to a digest mismatch."""
+    if isinstance(result, list):
+        return {"positions": len(result), "market_value": round(sum(float(p.get("market_value", 0)) for p in result), 0)}
+    if not isinstance(result, dict):
+        return {"value": _plain(result)}
+    scalars = {k: _plain(v) for k, v in result.items() if isinstance(v, (int, float, str, np.generic)) and not isinstance(v, bool)}
+    return dict(list(scalars.items())[:8])
+
+def load_golden() -> dict:
+    if not os.path.exists(GOLDEN_FILE):
+        return {"meta": {}, "cases": {}}
+    with open(GOLDEN_FILE, encoding="utf-8") as f:
+        return json.load(f)
+
+def save_golden(golden: dict):
+    golden["meta"] = {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "machine": platform.machine(),
+        "recorded": time.strftime("%Y-%m-%d"),
+    }
+    with open(GOLDEN_FILE, "w", encoding="utf-8") as f:
+        json.dump(golden, f, indent=1, sort_keys=True, ensure_ascii=False)
+        f.write("\n")
+
+# --- RUNNER ---
+
+def time_case(fn, repeat: int):
+    """(result of the first call, [ms per call] of `repeat` calls after it)."""
+    result = fn()   # also warms lazy imports, memos and surface caches
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return result, timings
+
+def run(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Time engine hot paths on synthetic data and check them against golden results.")
+    parser.add_argument("--update", action="store_true", help="record digests and timing baselines instead of comparing")
+    parser.add_argument("--baseline", metavar="REV", help="with --update: record the baseline-capable cases from core/engine.py and core/options_engine.py at this git revision")
+    parser.add_argument("--quick", action="store_true", help=f"only {', '.join(map(str, QUICK_YEARS))}-year histories")
+    parser.add_argument("--repeat", type=int, default=15, help="timed calls per case (default 15)")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="allowed median slowdown vs baseline (default 0.25)")
+    parser.add_argument("-k", dest="pattern", default="", help="only cases whose name contains this")
+    args = parser.parse_args(argv)
+
+    write_option_snapshot(synthetic_ohlcv("^TWII", 10), os.path.join(os.environ["WEALTH_OS_OPTIONS_DIR"], "txo_bench.csv"))
+    years = QUICK_YEARS if args.quick else YEARS
+    cases = {k: v for k, v in build_cases(years).items() if args.pattern in k}
+    baseline_cases = build_baseline_cases(years, args.baseline) if args.update and args.baseline else {}
+    golden = load_golden()
+    failures, slow = [], []
+
+    print(f"{'case':<34} {'min ms':>9} {'median ms':>10} {'baseline':>9}  status")
+    for name, fn in cases.items():
+        expected = golden["cases"].get(name)
+        if args.update and name in baseline_cases:
+            fn = baseline_cases[name]
+        elif args.update and expected and expected.get("source", "").startswith("baseline"):
+            # Keep the pre-optimization entry unless --baseline re-records it
+            print(f"{name:<34} {'':>9} {'':>10} {expected['median_ms']:>9.3f}  ⏭️ kept {expected['source']}")
+            continue
+
+        result, timings = time_case(fn, max(args.repeat, 1))
+        if expected and expected.get("schema") and not args.update:
+            # Baseline entry: compare on the baseline's schema (newer keys are additions)
+            result = project(result, expected["schema"])
+        entry = {"digest": digest(result), "summary": summary(result),
+                 "min_ms": round(min(timings), 3), "median_ms": round(statistics.median(timings), 3)}
+
+        if args.update:
+            if name in baseline_cases:
+                entry.update(source=f"baseline {args.baseline}", schema=schema(result))
+            golden["cases"][name] = entry
+            status = "📝 recorded"
+        elif expected is None:
+            status = "❔ no golden (run --update)"
+        elif entry["digest"] != expected["digest"]:
+            failures.append(name)
+            status = f"❌ FAIL output changed: {entry['summary']} != {expected['summary']}"
+        else:
+            baseline = expected["median_ms"]
+            ratio = entry["median_ms"] / baseline if baseline else 1.0
+            if ratio > 1 + args.threshold and entry["median_ms"] - baseline > MIN_DELTA_MS:
+                slow.append(name)
+                status = f"⚠️ SLOW x{ratio:.2f}"
+            else:
+                status = f"✅ ok x{ratio:.2f}"
+
+        baseline_ms = f"{expected['median_ms']:.3f}" if expected else "-"
+        print(f"{name:<34} {entry['min_ms']:>9.3f} {entry['median_ms']:>10.3f} {baseline_ms:>9}  {status}")
+
+    if args.update:
+        save_golden(golden)
+        print(f"\n📝 Golden results written to {GOLDEN_FILE}")
+        return 0
+
+    meta = golden.get("meta", {})
+    if failures and (meta.get("numpy"), meta.get("pandas")) != (np.__version__, pd.__version__):
+        print(f"\nℹ️ Golden recorded with numpy {meta.get('numpy')} / pandas {meta.get('pandas')}, running {np.__version__} / {pd.__version__}")
+    print(f"\n{len(cases) - len(failures) - len(slow)} ok, {len(failures)} output changes, {len(slow)} slower than baseline (+{args.threshold:.0%})")
+    return 1 if failures or slow else 0
+
+if __name__ == "__main__":
+    try:
+        sys.exit(run())
+    finally:
+        shutil.rmtree(BENCH_DIR, ignore_errors=True)
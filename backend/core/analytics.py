@@ -0,0 +1,145 @@
+import numpy as np
+import pandas as pd
+from core.payload import time_vector
+
+# --- PERFORMANCE ANALYTICS ---
+# Everything is derived from one equity / returns array pair without Python
+# loops over periods: period boundaries come from the date keys, per-period
+# peaks from one grouped cummax, per-period MDD from minimum.reduceat, and
+# rolling metrics from count-aware cumulative sums (O(n) for any window).
+
+ROLLING_WINDOW = 63   # ~3 months of trading days
+ANALYTICS_TAIL = 252  # points of the rolling / underwater series returned
+MIN_YEAR_BARS = 10    # shorter (partial) years are left out of the yearly table
+
+def period_bounds(index: pd.DatetimeIndex, freq: str):
+    """Start / end (exclusive) bar of every calendar year ('Y') or month ('M')."""
+    keys = index.year.to_numpy() * 12
+    if freq == 'M':
+        keys = keys + index.month.to_numpy() - 1
+    starts = np.flatnonzero(np.diff(keys, prepend=keys[0] - 1))
+    ends = np.append(starts[1:], len(keys))
+    return starts, ends
+
+def period_stats(equity: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> dict:
+    """
+    Return / MDD / profit per period, measured on the equity curve inside it
+    (first bar of the period to its last bar, like the yearly table always did).
+    """
+    start_eq = equity[starts]
+    end_eq = equity[ends - 1]
+    segment = np.repeat(np.arange(len(starts)), ends - starts)
+    peak = pd.Series(equity).groupby(segment).cummax().to_numpy()
+    drawdown = (equity - peak) / peak
+    return {
+        "return_pct": ((end_eq - start_eq) / start_eq) * 100,
+        "mdd_pct": np.minimum.reduceat(drawdown, starts) * 100,
+        "profit": end_eq - start_eq
+    }
+
+def rolling_metrics(returns: np.ndarray, risk_free_rate: float, window: int = ROLLING_WINDOW) -> dict:
+    """
+    Annualised rolling volatility (%), Sharpe and Sortino over `window` bars.
+    NaN returns are skipped; Sortino uses the sample std of the negative
+    returns in the window, matching the full-period Sortino.
+    """
+    if window < 2:
+        raise ValueError("rolling_window must be at least 2 bars")
+    n = len(returns)
+    valid = ~np.isnan(returns)
+    r = np.where(valid, returns, 0.0)
+    neg = valid & (r < 0)
+    rn = np.where(neg, r, 0.0)
+
+    def windowed(values):
+        csum = np.concatenate(([0.0], np.cumsum(values, dtype=np.float64)))
+        out = np.full(n, np.nan)
+        if n >= window:
+            out[window - 1:] = csum[window:] - csum[:-window]
+        return out
+
+    count, total, total_sq = windowed(valid), windowed(r), windowed(r * r)
+    neg_count, neg_total, neg_sq = windowed(neg), windowed(rn), windowed(rn * rn)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = total / count
+        std = np.sqrt(np.maximum(total_sq - total * mean, 0) / (count - 1))
+        neg_mean = neg_total / neg_count
+        down_std = np.sqrt(np.maximum(neg_sq - neg_total * neg_mean, 0) / (neg_count - 1))
+        excess = mean - risk_free_rate / 252
+        sharpe = np.where(std > 0, excess / std * np.sqrt(252), np.nan)
+        sortino = np.where(down_std > 0, excess / down_std * np.sqrt(252), np.nan)
+
+    return {
+        "volatility": std * np.sqrt(252) * 100,
+        "sharpe": sharpe,
+        "sortino": sortino
+    }
+
+def _series(values: np.ndarray, digits: int, columnar: bool):
+    values = np.round(values, digits)
+    if columnar:
+        # 2-D tables go out as one array per row (the binary format is 1-D only)
+        return list(values) if values.ndim == 2 else values
+    return np.where(np.isfinite(values), values, None).tolist()
+
+def yearly_table(equity: np.ndarray, index: pd.DatetimeIndex) -> list:
+    """Yearly return / MDD / profit rows, newest first; partial years under MIN_YEAR_BARS are skipped."""
+    starts, ends = period_bounds(index, 'Y')
+    stats = period_stats(equity, starts, ends)
+    keep = (ends - starts) >= MIN_YEAR_BARS
+    years = index.year.to_numpy()[starts][keep]
+    return [
+        {
+            "year": int(year),
+            "return_pct": round(ret, 2),
+            "mdd_pct": round(mdd, 2),
+            "profit": round(profit, 0)
+        }
+        for year, ret, mdd, profit in zip(years, stats['return_pct'][keep].tolist(), stats['mdd_pct'][keep].tolist(), stats['profit'][keep].tolist())
+    ][::-1]
+
+def performance_report(equity: np.ndarray, returns: np.ndarray, index: pd.DatetimeIndex, risk_free_rate: float, window: int = ROLLING_WINDOW, columnar: bool = False) -> dict:
+    """
+    Monthly return heatmap, rolling metrics and underwater curve.
+    columnar=True keeps NumPy arrays (and a 't' vector) for core.payload.
+    """
+    # Monthly heatmap: rows = years (oldest first), columns = Jan..Dec
+    m_starts, m_ends = period_bounds(index, 'M')
+    monthly = period_stats(equity, m_starts, m_ends)
+    m_years = index.year.to_numpy()[m_starts]
+    m_months = index.month.to_numpy()[m_starts]
+    table_years = np.unique(m_years)
+    returns_table = np.full((len(table_years), 12), np.nan)
+    mdd_table = np.full((len(table_years), 12), np.nan)
+    rows = np.searchsorted(table_years, m_years)
+    returns_table[rows, m_months - 1] = monthly['return_pct']
+    mdd_table[rows, m_months - 1] = monthly['mdd_pct']
+    month_returns = monthly['return_pct']
+
+    # Rolling metrics + underwater curve (tail only)
+    rolling = rolling_metrics(returns, risk_free_rate, window)
+    peak = np.maximum.accumulate(equity)
+    underwater = (equity - peak) / peak * 100
+    tail = slice(-ANALYTICS_TAIL, None)
+    dates = time_vector(index[tail]) if columnar else [str(d.date()) for d in index[tail]]
+
+    return {
+        "monthly_returns": {
+            "years": table_years.tolist(),
+            "return_pct": _series(returns_table, 2, columnar),
+            "mdd_pct": _series(mdd_table, 2, columnar),
+            "best_pct": round(float(month_returns.max()), 2),
+            "worst_pct": round(float(month_returns.min()), 2),
+            "positive_pct": round(float((month_returns > 0).mean() * 100), 2)
+        },
+        "rolling": {
+            "window": window,
+            ("t" if columnar else "dates"): dates,
+            **{k: _series(v[tail], 2, columnar) for k, v in rolling.items()}
+        },
+        "underwater": {
+            ("t" if columnar else "dates"): dates,
+            "drawdown_pct": _series(underwater[tail], 2, columnar)
+        }
+    }
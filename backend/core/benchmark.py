@@ -0,0 +1,115 @@
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from core.indicators import frame_key, read_only
+
+# --- BENCHMARK SERIES ---
+# Benchmark curves depend only on the benchmark frame and the strategy's
+# calendar, never on the strategy itself, so they are built once per
+# (benchmark frame, calendar) and shared by every simulate request:
+# alignment mask, aligned returns, growth curve (equity / initial capital),
+# drawdown, CAGR and MDD. Alignment keeps the benchmark bars whose calendar
+# date is in the strategy calendar, found with one searchsorted over the two
+# sorted indexes. Dates are compared as local, tz-naive days: a US listing
+# (America/New_York midnight) lines up with a .TW strategy (Asia/Taipei
+# midnight) on the same trading date.
+
+DEFAULT_BENCHMARKS = ("0050.TW",)
+MAX_BENCHMARKS = 5
+MAX_BENCHMARK_ENTRIES = 64
+
+_memo = OrderedDict()
+_memo_lock = threading.Lock()
+_memo_stats = {"hits": 0, "misses": 0}
+
+def parse_benchmarks(value: str) -> list:
+    """'0050,^TWII,TQQQ' -> unique symbols in order, at most MAX_BENCHMARKS."""
+    symbols = list(dict.fromkeys(s.strip().upper() for s in value.split(",") if s.strip()))
+    if len(symbols) > MAX_BENCHMARKS:
+        raise ValueError(f"At most {MAX_BENCHMARKS} benchmarks per request")
+    return symbols
+
+def calendar_key(symbol, df: pd.DataFrame):
+    """
+    Identity of a strategy's calendar: its frame identity (core.indicators.frame_key)
+    minus the last close, which never moves a date. None (no memo) without a symbol.
+    """
+    key = frame_key(symbol, df)
+    return key[:-1] if key is not None else None
+
+def calendar_days(index: pd.Index) -> pd.DatetimeIndex:
+    """Local trading dates, tz-naive midnight."""
+    index = pd.DatetimeIndex(index)
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    return index.normalize()
+
+def align_mask(index: pd.Index, calendar: pd.Index):
+    """
+    (mask, pos): bars of `index` whose date is also in `calendar` (both sorted),
+    and for each the position of that date in `calendar`.
+    """
+    days, calendar_dates = calendar_days(index), calendar_days(calendar)
+    pos = calendar_dates.searchsorted(days)
+    found = pos < len(calendar_dates)
+    found[found] = calendar_dates[pos[found]] == days[found]
+    return found, pos
+
+def _build(df: pd.DataFrame, calendar: pd.Index) -> dict:
+    close = df['Close'].to_numpy(dtype=np.float64)
+    mask, pos = align_mask(df.index, calendar)
+    b_close = close[mask]
+    n = len(b_close)
+    if n == 0:
+        return None
+
+    returns = np.empty(n)
+    returns[0] = np.nan
+    returns[1:] = b_close[1:] / b_close[:-1] - 1
+    growth = np.add(1, returns)
+    growth[np.isnan(growth)] = 1
+    np.cumprod(growth, out=growth)
+    peak = np.maximum.accumulate(growth)
+    drawdown = (growth - peak) / peak
+    return {
+        # Strategy timestamps of the aligned bars, so callers index on their own calendar
+        "index": calendar[pos[mask]],
+        "returns": read_only(returns),
+        "growth": read_only(growth),
+        "drawdown": read_only(drawdown),
+        "cagr": (growth[-1] ** (365 / n) - 1) * 100,
+        "mdd": drawdown.min() * 100,
+        "bars": n
+    }
+
+def benchmark_series(symbol, df: pd.DataFrame, calendar: pd.Index, calendar_id=None) -> dict:
+    """
+    Precomputed benchmark curves aligned to a strategy calendar, or None when
+    no bar overlaps. Memoized when both a benchmark symbol and a calendar_id
+    (calendar_key of the strategy frame) are given.
+    """
+    if df is None or df.empty or not len(calendar):
+        return None
+    base = frame_key(symbol, df)
+    if base is None or calendar_id is None:
+        return _build(df, calendar)
+
+    key = (base, calendar_id)
+    with _memo_lock:
+        if key in _memo:
+            _memo.move_to_end(key)
+            _memo_stats["hits"] += 1
+            return _memo[key]
+        _memo_stats["misses"] += 1
+
+    series = _build(df, calendar)
+    with _memo_lock:
+        _memo[key] = series
+        while len(_memo) > MAX_BENCHMARK_ENTRIES:
+            _memo.popitem(last=False)
+    return series
+
+def benchmark_stats() -> dict:
+    with _memo_lock:
+        return {"entries": len(_memo), **_memo_stats}
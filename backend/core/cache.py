@@ -0,0 +1,124 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+import pandas as pd
+from core.store import period_start, trading_days, slice_period
+
+# --- IN-PROCESS PRICE CACHE ---
+# Bounded LRU with per-entry TTL. One entry per symbol holding the longest
+# period fetched so far; shorter periods are answered by slicing it.
+
+CACHE_TTL = float(os.environ.get("WEALTH_OS_CACHE_TTL", "60"))
+CACHE_MAX_ENTRIES = int(os.environ.get("WEALTH_OS_CACHE_MAX_ENTRIES", "128"))
+CACHE_MAX_BYTES = int(os.environ.get("WEALTH_OS_CACHE_MAX_MB", "64")) * 1024 * 1024
+
+def period_covers(cached_period: str, cached_df: pd.DataFrame, period: str) -> bool:
+    """Can a frame fetched for `cached_period` answer a request for `period`?"""
+    if cached_period == period:
+        return True
+    n_days = trading_days(period)
+    if n_days is not None:
+        return len(cached_df) >= n_days
+    if trading_days(cached_period) is not None:
+        return False
+    if cached_period == "max":
+        return True
+    if period == "max":
+        return False
+    now = pd.Timestamp.now().normalize()
+    return period_start(cached_period, now) <= period_start(period, now)
+
+class PriceCache:
+    """
+    Symbol -> (period, frame) cache.
+    Every caller shares the cached frame's data: the engines are read-only and
+    Copy-on-Write keeps any write local, so only a shallow wrapper is handed out
+    (a caller adding a column never touches the shared frame).
+    """
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES, max_bytes: int = CACHE_MAX_BYTES, ttl: float = CACHE_TTL):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _drop(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= entry['nbytes']
+
+    def get(self, symbol: str, period: str):
+        with self._lock:
+            entry = self._entries.get(symbol)
+            if entry is not None and entry['expires'] < time.time():
+                self._drop(symbol)
+                self.expirations += 1
+                entry = None
+
+            if entry is None or not period_covers(entry['period'], entry['df'], period):
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(symbol)
+            self.hits += 1
+            df = entry['df']
+
+        return slice_period(df, period).copy(deep=False)
+
+    def put(self, symbol: str, period: str, df: pd.DataFrame, ttl: float = None):
+        if df is None or df.empty:
+            return
+        nbytes = int(df.memory_usage(index=True).sum())
+        if nbytes > self.max_bytes:
+            return
+
+        with self._lock:
+            existing = self._entries.get(symbol)
+            if existing is not None:
+                still_fresh = existing['expires'] >= time.time()
+                if still_fresh and not period_covers(period, df, existing['period']):
+                    # Keep the longer history; it already answers this period
+                    return
+                self._drop(symbol)
+
+            self._entries[symbol] = {
+                "period": period,
+                "df": df.copy(deep=False),
+                "expires": time.time() + (self.ttl if ttl is None else ttl),
+                "nbytes": nbytes
+            }
+            self._bytes += nbytes
+
+            # Evict least recently used until we are back under both limits
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": round(self.hits / lookups * 100, 2) if lookups else 0
+            }
+
+price_cache = PriceCache()
@@ -0,0 +1,162 @@
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from core.store import DATA_DIR
+
+# --- LOCAL STORE (SQLite, WAL) ---
+# Portfolio positions and simulator settings live in one SQLite file in WAL
+# mode: writers serialize on BEGIN IMMEDIATE, readers never block, and every
+# gunicorn worker / thread sees committed data. Each thread keeps its own
+# connection. Reads are served from an in-memory copy validated against the
+# (mtime, size) of the database and its WAL, so a dashboard refresh costs a
+# couple of stat() calls unless another process wrote in between; writes in
+# this process drop the copy directly.
+# The legacy portfolio.json / sim_settings.json are imported once.
+
+DB_FILE = os.environ.get("WEALTH_OS_DB", os.path.join(DATA_DIR, "wealth_os.db"))
+LEGACY_PORTFOLIO_FILE = os.path.join(DATA_DIR, "portfolio.json")
+LEGACY_SETTINGS_FILE = os.path.join(DATA_DIR, "sim_settings.json")
+
+# Seconds a writer waits for the lock held by another worker
+BUSY_TIMEOUT = float(os.environ.get("WEALTH_OS_DB_TIMEOUT", "10"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS positions (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT NOT NULL UNIQUE,
+    symbol TEXT NOT NULL,
+    shares REAL NOT NULL,
+    avg_cost REAL NOT NULL,
+    created_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_positions_symbol ON positions(symbol);
+CREATE TABLE IF NOT EXISTS settings (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+POSITION_COLUMNS = ("id", "symbol", "shares", "avg_cost", "created_at")
+
+_local = threading.local()
+_cache = {}
+_cache_lock = threading.Lock()
+
+def open_db(path: str, schema: str) -> sqlite3.Connection:
+    """WAL-mode connection in autocommit mode (transactions are opened explicitly)."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT, isolation_level=None, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(schema)
+    return conn
+
+def connection() -> sqlite3.Connection:
+    """This thread's connection to DB_FILE (schema and legacy import on first open)."""
+    conn = getattr(_local, "conn", None)
+    if conn is not None and _local.path == DB_FILE:
+        return conn
+
+    conn = open_db(DB_FILE, SCHEMA)
+    _local.conn, _local.path = conn, DB_FILE
+    _import_legacy(conn)
+    return conn
+
+@contextmanager
+def immediate(conn: sqlite3.Connection):
+    """Write transaction on `conn`; takes the database write lock up front."""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+
+@contextmanager
+def transaction():
+    """Write transaction on this thread's store connection (drops the read copy)."""
+    try:
+        with immediate(connection()) as conn:
+            yield conn
+    finally:
+        invalidate()
+
+def _import_legacy(conn: sqlite3.Connection):
+    """Copy portfolio.json / sim_settings.json into a fresh database, once."""
+    with immediate(conn):
+        if conn.execute("SELECT 1 FROM meta WHERE key = 'legacy_import'").fetchone() is not None:
+            return
+        positions = _read_json(LEGACY_PORTFOLIO_FILE, [])
+        insert_positions(conn, positions)
+        settings = _read_json(LEGACY_SETTINGS_FILE, None)
+        if settings is not None:
+            conn.execute("INSERT OR REPLACE INTO settings (key, value) VALUES ('sim', ?)", (json.dumps(settings),))
+        conn.execute("INSERT INTO meta (key, value) VALUES ('legacy_import', ?)", (str(len(positions)),))
+        if positions or settings is not None:
+            print(f"🗄️ Imported {len(positions)} positions{' and settings' if settings is not None else ''} into {DB_FILE}")
+
+def _read_json(path: str, default):
+    if not os.path.exists(path):
+        return default
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"⚠️ Could not import {path}: {e}")
+        return default
+
+def insert_positions(conn: sqlite3.Connection, positions: list):
+    """Bulk insert inside the caller's transaction."""
+    conn.executemany(
+        "INSERT INTO positions (id, symbol, shares, avg_cost, created_at) VALUES (?, ?, ?, ?, ?)",
+        [tuple(p.get(c) for c in POSITION_COLUMNS) for p in positions]
+    )
+
+# --- READ COPY ---
+
+def _signature():
+    sig = []
+    for path in (DB_FILE, DB_FILE + "-wal"):
+        try:
+            st = os.stat(path)
+            sig.append((st.st_mtime_ns, st.st_size))
+        except FileNotFoundError:
+            sig.append(None)
+    return tuple(sig)
+
+def invalidate():
+    with _cache_lock:
+        _cache.clear()
+
+def cached(name: str, loader):
+    """loader(conn)'s result, reused until the database files change."""
+    conn = connection()
+    # Taken before loading: a write that lands mid-load only makes the next call reload
+    sig = _signature()
+    with _cache_lock:
+        hit = _cache.get(name)
+        if hit is not None and hit[0] == sig:
+            return hit[1]
+    value = loader(conn)
+    with _cache_lock:
+        _cache[name] = (sig, value)
+    return value
+
+# --- SETTINGS ---
+
+def load_settings() -> dict:
+    raw = cached("settings", lambda conn: conn.execute("SELECT value FROM settings WHERE key = 'sim'").fetchone())
+    # Parsed per call so callers can modify their copy
+    return json.loads(raw['value']) if raw is not None else {}
+
+def save_settings(settings: dict):
+    with transaction() as conn:
+        conn.execute("INSERT OR REPLACE INTO settings (key, value) VALUES ('sim', ?)", (json.dumps(settings),))
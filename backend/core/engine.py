@@ -1,45 +1,31 @@
 import numpy as np
 import pandas as pd
+from core.indicators import indicator_snapshot, indicator, price_arrays
+from core.payload import time_vector, rounded
+from core.analytics import yearly_table, performance_report, ROLLING_WINDOW
+from core.benchmark import benchmark_series, calendar_key
 
-def calculate_ma_strategy(df: pd.DataFrame, short_ma: int = 20, long_ma: int = 60) -> dict:
+def calculate_ma_strategy(df: pd.DataFrame, short_ma: int = 20, long_ma: int = 60, symbol: str = None, columnar: bool = False) -> dict:
     """
     The Universal Logic Engine.
     Applies the "Traffic Light" logic to ANY asset dataframe.
+    With a symbol, indicators come from that symbol's incremental state, so a
+    revised last bar (live tick) is O(1) instead of a full rolling recompute.
+    columnar=True returns chart_data as parallel arrays (see core.payload).
     """
-    # 1. Calculate Indicators
-    df['MA_Ultra_Short'] = df['Close'].rolling(window=10).mean() # MA10
-    df['MA_Short'] = df['Close'].rolling(window=short_ma).mean()
-    df['MA_Long'] = df['Close'].rolling(window=long_ma).mean()
+    # 1. Indicators (MA10 / MA short / MA long, RSI-14, MACD, HV20)
+    snapshot = indicator_snapshot(symbol, df, short_ma, long_ma)
+    latest = snapshot['latest']
 
-    # --- ADVANCED INDICATORS (V3) ---
-    
-    # 1. RSI (Relative Strength Index)
-    delta = df['Close'].diff()
-    gain = (delta.where(delta > 0, 0)).rolling(window=14).mean()
-    loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
-    rs = gain / loss
-    df['RSI'] = 100 - (100 / (1 + rs))
-    
-    # 2. MACD
-    ema12 = df['Close'].ewm(span=12, adjust=False).mean()
-    ema26 = df['Close'].ewm(span=26, adjust=False).mean()
-    df['MACD'] = ema12 - ema26
-    df['Signal_Line'] = df['MACD'].ewm(span=9, adjust=False).mean()
-    
-    # 3. Volatility (HV20) - NEW
-    df['Log_Ret'] = np.log(df['Close'] / df['Close'].shift(1))
-    df['HV20'] = df['Log_Ret'].rolling(window=20).std() * np.sqrt(252) * 100
-    
     # 2. Get Latest State
-    latest = df.iloc[-1]
-    price = latest['Close']
-    ma_us = latest['MA_Ultra_Short']
-    ma_s = latest['MA_Short']
-    ma_l = latest['MA_Long']
-    rsi = latest['RSI']
-    macd = latest['MACD']
-    signal_line = latest['Signal_Line']
-    hv_current = latest['HV20'] if not pd.isna(latest['HV20']) else 0
+    price = float(df['Close'].iloc[-1])
+    ma_us = latest['ma_ultra_short']
+    ma_s = latest['ma_short']
+    ma_l = latest['ma_long']
+    rsi = latest['rsi']
+    macd = latest['macd']
+    signal_line = latest['signal_line']
+    hv_current = latest['hv'] if not pd.isna(latest['hv']) else 0
     
     # --- LOGIC BOARD ---
     # Logic: 
@@ -98,27 +84,34 @@ def calculate_ma_strategy(df: pd.DataFrame, short_ma: int = 20, long_ma: int = 6
         
     ai_report = " ".join(report)
 
-    # Prepare Chart Data (Last 90 days)
-    chart_df = df.tail(90).copy()
-    chart_data = []
-    
     # Check for direct 'DayChange' from Scraper
     direct_change = None
     if 'DayChange' in df.columns and not pd.isna(df['DayChange'].iloc[-1]):
         direct_change = float(df['DayChange'].iloc[-1])
 
-    for index, row in chart_df.iterrows():
-        chart_data.append({
-            "date": str(index.date()),
-            "open": round(row['Open'], 2),
-            "high": round(row['High'], 2),
-            "low": round(row['Low'], 2),
-            "close": round(row['Close'], 2),
-            "price": round(row['Close'], 2), # Keep for backward compatibility
-            "ma_ultra_short": round(row['MA_Ultra_Short'], 2) if not pd.isna(row['MA_Ultra_Short']) else None,
-            "ma_short": round(row['MA_Short'], 2) if not pd.isna(row['MA_Short']) else None,
-            "ma_long": round(row['MA_Long'], 2) if not pd.isna(row['MA_Long']) else None
-        })
+    # Prepare Chart Data (Last 90 days)
+    chart_df = df.tail(len(snapshot['chart']))
+    if columnar:
+        chart_data = {
+            "t": time_vector(chart_df.index),
+            **{c.lower(): rounded(chart_df[c]) for c in ('Open', 'High', 'Low', 'Close')},
+            **{ma: rounded([row[ma] for row in snapshot['chart']]) for ma in ('ma_ultra_short', 'ma_short', 'ma_long')}
+        }
+    else:
+        chart_data = []
+        ohlc = zip(chart_df.index, *(chart_df[c].tolist() for c in ('Open', 'High', 'Low', 'Close')))
+        for (index, open_, high, low, close), row in zip(ohlc, snapshot['chart']):
+            chart_data.append({
+                "date": str(index.date()),
+                "open": round(open_, 2),
+                "high": round(high, 2),
+                "low": round(low, 2),
+                "close": round(close, 2),
+                "price": round(close, 2), # Keep for backward compatibility
+                "ma_ultra_short": round(row['ma_ultra_short'], 2) if not pd.isna(row['ma_ultra_short']) else None,
+                "ma_short": round(row['ma_short'], 2) if not pd.isna(row['ma_short']) else None,
+                "ma_long": round(row['ma_long'], 2) if not pd.isna(row['ma_long']) else None
+            })
 
     return {
         "price": round(price, 2),
@@ -127,7 +120,7 @@ def calculate_ma_strategy(df: pd.DataFrame, short_ma: int = 20, long_ma: int = 6
         "status": status,
         "ui_color": color,
         "suggested_action": action,
-        "timestamp": str(latest.name),
+        "timestamp": str(df.index[-1]),
         "rsi": round(rsi, 2) if not pd.isna(rsi) else 50,
         "macd": round(macd, 2) if not pd.isna(macd) else 0,
         "hv": round(hv_current, 2),
@@ -138,173 +131,244 @@ def calculate_ma_strategy(df: pd.DataFrame, short_ma: int = 20, long_ma: int = 6
         "direct_change": direct_change # Pass this to UI
     }
 
-def run_backtest_simulation(df: pd.DataFrame, initial_capital: float = 100000, strategy_type: str = 'ma_trend', ma_period: int = 60, leverage: float = 1.0, benchmark_df: pd.DataFrame = None):
+# --- BACKTEST KERNEL (NumPy) ---
+# Works on plain float arrays so the caller's frame is never mutated.
+# Statistics mirror pandas' NaN-skipping mean/std bit for bit, so results
+# are identical to the previous DataFrame implementation.
+
+RISK_FREE_RATE = 0.015 # 1.5%
+
+def signals_from_ma(close: np.ndarray, ma: np.ndarray, strategy_type: str) -> np.ndarray:
+    """Position signal per bar: 1 long, -1 short, 0 flat."""
+    signal = np.zeros(len(close))
+    if strategy_type == 'ma_trend':
+        signal[close > ma] = 1
+        signal[close < ma] = -1
+    elif strategy_type == 'ma_long':
+        signal[close > ma] = 1
+    else:
+        signal[:] = 1
+    return signal
+
+def extract_trades(signal: np.ndarray):
+    """
+    Entry/exit bar indices of closed trades, reconstructed from signal changes.
+    The position always follows the signal, so every run of a constant non-zero
+    signal is one trade, closed on the bar where the signal changes
+    (a flip Long <-> Short closes and re-opens on the same bar).
+    """
+    change = np.flatnonzero(np.diff(signal, prepend=0) != 0)
+    opens = signal[change[:-1]] != 0
+    return change[:-1][opens], change[1:][opens]
+
+def _nan_mean(values: np.ndarray):
+    mask = np.isnan(values)
+    count = len(values) - mask.sum()
+    if count == 0:
+        return np.nan
+    return np.where(mask, 0, values).sum(dtype=np.float64) / count
+
+def _nan_std(values: np.ndarray):
+    """Sample std (ddof=1) skipping NaN, same summation order as pandas."""
+    mask = np.isnan(values)
+    count = len(values) - mask.sum()
+    if count <= 1:
+        return np.nan
+    avg = np.where(mask, 0, values).sum(dtype=np.float64) / count
+    sqr = (avg - values) ** 2
+    np.putmask(sqr, mask, 0)
+    return np.sqrt(sqr.sum(dtype=np.float64) / (count - 1))
+
+def equity_from_returns(returns: np.ndarray, initial_capital: float) -> np.ndarray:
+    """Compounded equity curve; NaN returns count as flat days."""
+    growth = np.empty(len(returns))
+    np.add(1, returns, out=growth)
+    growth[np.isnan(growth)] = 1
+    np.cumprod(growth, out=growth)
+    growth *= initial_capital
+    return growth
+
+def drawdown_curve(equity: np.ndarray) -> np.ndarray:
+    peak = np.maximum.accumulate(equity)
+    return (equity - peak) / peak
+
+def backtest_kernel(close: np.ndarray, signal: np.ndarray, leverage: float, initial_capital: float) -> dict:
+    """
+    Core performance math on preallocated arrays.
+    Returns the per-bar arrays plus CAGR / MDD / Sharpe / Sortino.
+    """
+    n = len(close)
+    returns = np.empty(n)
+    returns[0] = np.nan
+    np.divide(close[1:], close[:-1], out=returns[1:])
+    returns[1:] -= 1
+
+    prev_signal = np.empty(n)
+    prev_signal[0] = np.nan
+    prev_signal[1:] = signal[:-1]
+    strategy_returns = returns * prev_signal * leverage
+
+    equity = equity_from_returns(strategy_returns, initial_capital)
+    drawdown = drawdown_curve(equity)
+    final_equity = equity[-1]
+
+    cagr = ((final_equity / initial_capital) ** (365 / n) - 1) * 100 if n > 0 else 0
+    mdd = drawdown.min() * 100
+
+    # Risk Metrics (Sharpe & Sortino)
+    daily_rf = RISK_FREE_RATE / 252
+    excess_mean = _nan_mean(strategy_returns - daily_rf)
+    std = _nan_std(strategy_returns)
+    sharpe = 0
+    if std != 0:
+        sharpe = (excess_mean / std) * (252 ** 0.5)
+
+    # Sortino Ratio (Downside Risk only)
+    downside = strategy_returns[strategy_returns < 0]
+    sortino = 0
+    if len(downside) > 0:
+        downside_std = _nan_std(downside)
+        if downside_std != 0:
+            sortino = (excess_mean / downside_std) * (252 ** 0.5)
+
+    return {
+        "returns": returns,
+        "strategy_returns": strategy_returns,
+        "equity": equity,
+        "drawdown": drawdown,
+        "final_equity": final_equity,
+        "cagr": cagr,
+        "mdd": mdd,
+        "sharpe": sharpe,
+        "sortino": sortino
+    }
+
+def run_backtest_simulation(df: pd.DataFrame, initial_capital: float = 100000, strategy_type: str = 'ma_trend', ma_period: int = 60, leverage: float = 1.0, benchmark_df: pd.DataFrame = None, symbol: str = None, columnar: bool = False, analytics: bool = False, rolling_window: int = ROLLING_WINDOW, benchmarks: dict = None):
     """
     Vectorized Backtest Engine (V5 - Pro)
     Strategies: 'ma_trend', 'ma_long', 'buy_hold'
     Features: Custom MA, Leverage, MDD, Win Rate, Benchmark Comparison, Trade Logs, Yearly Stats
+    Read-only on `df`: all intermediate series live in NumPy arrays, and the
+    MA comes from the shared indicator memo when a symbol is given.
+    columnar=True returns equity_curve / trade_list as parallel arrays (see core.payload).
+    benchmarks: {symbol: price frame}, each reported under "benchmarks" (after benchmark_df if given).
+    A None frame (fetch failed) or one with no overlapping bars is listed in
+    "benchmark_errors"; benchmark_cagr / benchmark_mdd stay 0 when that is the first one.
+    analytics=True adds the monthly table, rolling Sharpe / Sortino / volatility
+    and the underwater curve (see core.analytics).
     """
-    # ... (same indicator and signal calculation) ...
-    col_name = f'MA_{ma_period}'
-    if col_name not in df.columns:
-        df[col_name] = df['Close'].rolling(window=ma_period).mean()
+    close = price_arrays(df)['close']
+    index = df.index
 
-    df['Signal'] = 0
-    if strategy_type == 'ma_trend':
-        df.loc[df['Close'] > df[col_name], 'Signal'] = 1
-        df.loc[df['Close'] < df[col_name], 'Signal'] = -1
-    elif strategy_type == 'ma_long':
-        df.loc[df['Close'] > df[col_name], 'Signal'] = 1
+    col_name = f'MA_{ma_period}'
+    if col_name in df.columns:
+        ma = df[col_name].to_numpy(dtype=np.float64)
     else:
-        df['Signal'] = 1
-    
+        ma = indicator(symbol, df, "sma", ma_period)
+
+    signal = signals_from_ma(close, ma, strategy_type)
+
     # --- TRADE LOG GENERATION ---
-    trades = []
-    position = 0
-    entry_price = 0
-    entry_date = None
-    
-    # Iterate for trade logs (Hybrid approach: Vectorized for perf, Loop for logs)
-    # Note: For strict vectorization we'd skip this, but logs are requested.
-    # To keep it fast, we only loop if needed or just reconstruct from signals.
-    # Let's use reconstruction from signal changes.
-    
-    df['Prev_Signal'] = df['Signal'].shift(1).fillna(0)
-    # Entry: Signal becomes non-zero
-    # Exit: Signal becomes zero OR Signal flips (reversal)
-    
-    # Simple loop for robust log generation
-    for date, row in df.iterrows():
-        signal = row['Signal']
-        price = row['Close']
-        
-        # Open Position
-        if position == 0 and signal != 0:
-            position = signal
-            entry_price = price
-            entry_date = date
-        
-        # Close Position (Signal changed or became 0)
-        elif position != 0 and signal != position:
-            exit_price = price
-            pnl_pct = (exit_price - entry_price) / entry_price * position * leverage
-            pnl_amount = initial_capital * pnl_pct # Not exact compounding but ok for log display
-            
-            trades.append({
-                "entry_date": str(entry_date.date()),
-                "entry_price": round(entry_price, 2),
-                "type": "LONG" if position == 1 else "SHORT",
-                "exit_date": str(date.date()),
-                "exit_price": round(exit_price, 2),
-                "pnl_pct": round(pnl_pct * 100, 2),
-                "duration": (date - entry_date).days
-            })
-            
-            # Re-entry if signal flips directly (e.g. Long to Short)
-            if signal != 0:
-                position = signal
-                entry_price = price
-                entry_date = date
-            else:
-                position = 0
+    entry_idx, exit_idx = extract_trades(signal)
+    position = signal[entry_idx]
+    entry_prices = close[entry_idx]
+    exit_prices = close[exit_idx]
+    pnl_pct = (exit_prices - entry_prices) / entry_prices * position * leverage
+    durations = (index[exit_idx] - index[entry_idx]).days
 
-    # --- PERFORMANCE CALCULATION ---
-    df['Returns'] = df['Close'].pct_change()
-    df['Strategy_Returns'] = df['Returns'] * df['Signal'].shift(1) * leverage
-    df['Equity'] = (1 + df['Strategy_Returns'].fillna(0)).cumprod() * initial_capital
-    final_equity = df['Equity'].iloc[-1]
-    
-    days = len(df)
-    cagr = ((final_equity / initial_capital) ** (365 / days) - 1) * 100 if days > 0 else 0
+    trade_pnl = np.round(pnl_pct * 100, 2)
+    if columnar:
+        # Newest first, like the row format
+        trades = {
+            "entry_t": time_vector(index[entry_idx])[::-1],
+            "entry_price": rounded(entry_prices)[::-1],
+            "type": np.where(position == 1, "LONG", "SHORT")[::-1].tolist(),
+            "exit_t": time_vector(index[exit_idx])[::-1],
+            "exit_price": rounded(exit_prices)[::-1],
+            "pnl_pct": trade_pnl[::-1],
+            "duration": np.asarray(durations, dtype=np.int64)[::-1]
+        }
+    else:
+        trades = [
+            {
+                "entry_date": str(index[e].date()),
+                "entry_price": round(ep, 2),
+                "type": "LONG" if pos == 1 else "SHORT",
+                "exit_date": str(index[x].date()),
+                "exit_price": round(xp, 2),
+                "pnl_pct": pp,
+                "duration": int(d)
+            }
+            for e, x, pos, ep, xp, pp, d in zip(entry_idx, exit_idx, position, entry_prices, exit_prices, trade_pnl, durations)
+        ][::-1] # Newest first
 
-    # 1. MDD (Max Drawdown)
-    rolling_max = df['Equity'].cummax()
-    drawdown = (df['Equity'] - rolling_max) / rolling_max
-    mdd = drawdown.min() * 100 
-    
-    # 2. Risk Metrics (Sharpe & Sortino)
-    risk_free_rate = 0.015 # 1.5%
-    daily_rf = risk_free_rate / 252
-    
-    # Sharpe Ratio
-    excess_returns = df['Strategy_Returns'] - daily_rf
-    sharpe = 0
-    if df['Strategy_Returns'].std() != 0:
-        sharpe = (excess_returns.mean() / df['Strategy_Returns'].std()) * (252 ** 0.5)
-        
-    # Sortino Ratio (Downside Risk only)
-    downside_returns = df['Strategy_Returns'][df['Strategy_Returns'] < 0]
-    sortino = 0
-    if len(downside_returns) > 0 and downside_returns.std() != 0:
-        sortino = (excess_returns.mean() / downside_returns.std()) * (252 ** 0.5) 
+    # --- PERFORMANCE CALCULATION ---
+    perf = backtest_kernel(close, signal, leverage, initial_capital)
+    equity = perf['equity']
+    final_equity = perf['final_equity']
+    days = len(close)
     
-    # 2. Trades & Win Rate
-    # trades list is already built
-    total_trades = len(trades)
-    winning_trades = len([t for t in trades if t['pnl_pct'] > 0])
+    # Trades & Win Rate
+    total_trades = len(entry_idx)
+    winning_trades = int((trade_pnl > 0).sum())
     win_rate = (winning_trades / total_trades * 100) if total_trades > 0 else 0
     
-    # 3. Yearly Stats
-    df['Year'] = df.index.year
-    yearly_stats = []
-    
-    # Group by Year
-    for year, group in df.groupby('Year'):
-        if len(group) < 10: continue
-        
-        start_eq = group['Equity'].iloc[0]
-        end_eq = group['Equity'].iloc[-1]
-        
-        # Year Return - Approximate based on equity curve within that year
-        # Note: The first day of year might inherit position from prev year
-        # Better: (End / Start) - 1
-        year_return = ((end_eq - start_eq) / start_eq) * 100
-        
-        # Year MDD
-        g_roll = group['Equity'].cummax()
-        g_dd = (group['Equity'] - g_roll) / g_roll
-        year_mdd = g_dd.min() * 100
-        
-        yearly_stats.append({
-            "year": int(year),
-            "return_pct": round(year_return, 2),
-            "mdd_pct": round(year_mdd, 2),
-            "profit": round(end_eq - start_eq, 0)
-        })
-        
-    yearly_stats.reverse() # Newest first
+    # Yearly Stats (one vectorized pass, see core.analytics)
+    yearly_stats = yearly_table(equity, index)
 
     # --- BENCHMARK CALCULATION ---
-    benchmark_cagr = 0
-    benchmark_mdd = 0
-    if benchmark_df is not None and not benchmark_df.empty:
-        # Align dates with the strategy df
-        b_df = benchmark_df[benchmark_df.index.isin(df.index)].copy()
-        if not b_df.empty:
-            b_df['Returns'] = b_df['Close'].pct_change()
-            b_df['Equity'] = (1 + b_df['Returns'].fillna(0)).cumprod() * initial_capital
-            b_final = b_df['Equity'].iloc[-1]
-            benchmark_cagr = ((b_final / initial_capital) ** (365 / len(b_df)) - 1) * 100
-            
-            b_rolling_max = b_df['Equity'].cummax()
-            b_drawdown = (b_df['Equity'] - b_rolling_max) / b_rolling_max
-            benchmark_mdd = b_drawdown.min() * 100
+    # Precomputed per (benchmark frame, calendar) in core.benchmark; the first one feeds benchmark_cagr / benchmark_mdd
+    benchmark_rows = []
+    benchmark_errors = {}
+    benchmark_cagr = benchmark_mdd = 0
+    items = list((benchmarks or {}).items())
+    if benchmark_df is not None:
+        items.insert(0, (None, benchmark_df))
+    curve_dates = index[-100:]
+    calendar_id = calendar_key(symbol, df)
+    for i, (b_symbol, b_df) in enumerate(items):
+        if b_df is None or b_df.empty:
+            benchmark_errors[b_symbol] = "no data"
+            continue
+        series = benchmark_series(b_symbol, b_df, index, calendar_id)
+        if series is None:
+            benchmark_errors[b_symbol] = "no bars overlap the strategy dates"
+            continue
+        if i == 0:
+            benchmark_cagr, benchmark_mdd = series['cagr'], series['mdd']
+        # Equity as of each of the strategy's last 100 dates
+        pos = series['index'].searchsorted(curve_dates, side='right') - 1
+        b_curve = np.where(pos >= 0, series['growth'][pos] * initial_capital, np.nan)
+        benchmark_rows.append({
+            "symbol": b_symbol,
+            "cagr_percent": round(series['cagr'], 2),
+            "mdd_percent": round(series['mdd'], 2),
+            "total_return_pct": round((series['growth'][-1] - 1) * 100, 2),
+            "bars": series['bars'],
+            "equity_curve": b_curve if columnar else np.where(np.isnan(b_curve), None, b_curve).tolist()
+        })
 
-    return {
+    result = {
         "final_equity": round(final_equity, 0),
         "total_return_pct": round(((final_equity - initial_capital) / initial_capital) * 100, 2), # New Metric
-        "cagr_percent": round(cagr, 2),
-        "mdd_percent": round(mdd, 2),
-        "sharpe_ratio": round(sharpe, 2),
-        "sortino_ratio": round(sortino, 2),
+        "cagr_percent": round(perf['cagr'], 2),
+        "mdd_percent": round(perf['mdd'], 2),
+        "sharpe_ratio": round(perf['sharpe'], 2),
+        "sortino_ratio": round(perf['sortino'], 2),
         "win_rate": round(win_rate, 2),
         "total_trades": int(total_trades),
         "benchmark_cagr": round(benchmark_cagr, 2),
         "benchmark_mdd": round(benchmark_mdd, 2),
-        "equity_curve": df['Equity'].fillna(initial_capital).tolist()[-100:],
-        "trade_list": trades[::-1], # Newest first
+        "benchmarks": benchmark_rows,
+        "equity_curve": {"t": time_vector(index[-100:]), "equity": equity[-100:]} if columnar else equity[-100:].tolist(),
+        "trade_list": trades,
         "yearly_stats": yearly_stats,
-        "period_start": str(df.index[0].date()),
-        "period_end": str(df.index[-1].date()),
+        "period_start": str(index[0].date()),
+        "period_end": str(index[-1].date()),
         "duration_years": round(days / 365.25, 1)
     }
+    if benchmark_errors:
+        result['benchmark_errors'] = benchmark_errors
+    if analytics:
+        result.update(performance_report(equity, perf['strategy_returns'], index, RISK_FREE_RATE, rolling_window, columnar))
+    return result
@@ -1,11 +1,26 @@
-import yfinance as yf
 import pandas as pd
+import numpy as np
 import certifi
 import os
-import requests
 import shutil
-from bs4 import BeautifulSoup
 import traceback
+import re
+from html import unescape
+import asyncio
+import threading
+import functools
+import httpx
+from concurrent.futures import ThreadPoolExecutor
+from core.store import get_history
+from core.cache import price_cache
+from core.singleflight import coalesce
+from core.sharedcache import shared_fetch
+from core.pricing import bs_greeks
+from core.volsurface import current_surface
+
+# yfinance (~0.8s with its protobuf / curl stack), bs4 and requests are
+# imported on first use so a cold start does not pay for them before the
+# first request; setup_environment() runs once from the app lifespan.
 
 # FORCE SSL CERTIFICATE PATH
 os.environ['SSL_CERT_FILE'] = certifi.where()
@@ -23,121 +38,258 @@ SYMBOL_MAP = {
     "TAIEX": "^TWII"
 }
 
+# Cache lifetime (seconds) for symbols patched with live scraped ticks
+LIVE_CACHE_TTL = float(os.environ.get("WEALTH_OS_LIVE_CACHE_TTL", "15"))
+
+# --- NON-BLOCKING I/O ---
+# yfinance / file store / HTML parsing are blocking, so they run on a bounded
+# thread pool. A semaphore caps how many upstream calls are in flight at once.
+FETCH_MAX_WORKERS = int(os.environ.get("WEALTH_OS_FETCH_WORKERS", "8"))
+FETCH_MAX_CONCURRENCY = int(os.environ.get("WEALTH_OS_FETCH_CONCURRENCY", "4"))
+HTTP_TIMEOUT = float(os.environ.get("WEALTH_OS_HTTP_TIMEOUT", "5"))
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+
+_executor = ThreadPoolExecutor(max_workers=FETCH_MAX_WORKERS, thread_name_prefix="fetch")
+_upstream_limit = asyncio.Semaphore(FETCH_MAX_CONCURRENCY)
+_http_client = None
+
+_env_lock = threading.Lock()
+_env_ready = False
+
+def setup_environment():
+    """
+    One-time SSL / yfinance cache path fixes (Crucial for Windows/Chinese Paths).
+    Called once from the app lifespan (fetches only hit the _env_ready guard);
+    os.environ must not be rewritten while fetches run in parallel.
+    """
+    global _env_ready
+    with _env_lock:
+        if _env_ready:
+            return
+
+        # 1. Fix Certificate Path (Windows: certifi may sit under a non-ASCII path curl cannot open)
+        cert_path = certifi.where()
+        if os.name == "nt":
+            safe_cert_path = "C:\\Users\\Public\\wealth_os_cacert.pem"
+            try:
+                if not os.path.exists(safe_cert_path):
+                    shutil.copy(cert_path, safe_cert_path)
+                cert_path = safe_cert_path
+            except Exception as e:
+                print(f"⚠️ SSL Fix Failed: {e}")
+        os.environ['CURL_CA_BUNDLE'] = cert_path
+        os.environ['SSL_CERT_FILE'] = cert_path
+        os.environ['REQUESTS_CA_BUNDLE'] = cert_path
+
+        # 2. Fix Cache Path (elsewhere the literal Windows path would land in the working directory)
+        if os.name == "nt":
+            try:
+                safe_cache_path = "C:\\Users\\Public\\yfinance_cache"
+                if not os.path.exists(safe_cache_path):
+                     os.makedirs(safe_cache_path)
+                os.environ['YFINANCE_CACHE_DIR'] = safe_cache_path
+            except Exception as e:
+                print(f"⚠️ Cache Fix Failed: {e}")
+
+        _env_ready = True
+
+async def run_blocking(func, *args, **kwargs):
+    """Run a blocking upstream call on the fetch pool without stalling the event loop."""
+    loop = asyncio.get_running_loop()
+    async with _upstream_limit:
+        return await loop.run_in_executor(_executor, functools.partial(func, *args, **kwargs))
+
+def get_http_client() -> httpx.AsyncClient:
+    """Shared async HTTP client (keep-alive pool) for scraping."""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            headers={"User-Agent": USER_AGENT},
+            timeout=HTTP_TIMEOUT,
+            follow_redirects=True,
+            limits=httpx.Limits(max_connections=FETCH_MAX_CONCURRENCY * 2, max_keepalive_connections=FETCH_MAX_CONCURRENCY)
+        )
+    return _http_client
+
+async def close_http_client():
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
 def get_session():
+    import requests
     session = requests.Session()
     session.headers.update({
         'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
     })
     return session
 
-def fetch_yahoo_realtime(symbol: str):
+# --- YAHOO TW SCRAPER ---
+# Targeted extraction: find the big price span with a regex instead of building
+# the whole DOM. BeautifulSoup is only used as a fallback if the markup changes.
+PRICE_TAG_RE = {
+    size: re.compile(r'<(\w+)[^>]*class="[^"]*Fz\(' + size + r'\)[^"]*"[^>]*>([^<]*)<')
+    for size in ("32px", "42px")
+}
+CHANGE_RE = re.compile(r'([▲▼\+\-]?\s*\d+\.?\d*)\s*\(.*?%\)')
+TAG_RE = re.compile(r'<[^>]+>')
+
+def _parse_change(container_text: str, is_down: bool) -> float:
+    match = CHANGE_RE.search(container_text)
+    if not match:
+        return 0
+    change_str = match.group(1).replace("▲", "").replace("▼", "").replace("+", "").replace(",", "").strip()
+    change_val = float(change_str)
+    # Determine sign using robust class detection
+    return -abs(change_val) if is_down else abs(change_val)
+
+def extract_yahoo_quote(html: str):
+    """
+    Fast path: (price, change) from a Yahoo TW quote page, or None if the
+    price span is not found.
+    """
+    for size in ("32px", "42px"):
+        match = PRICE_TAG_RE[size].search(html)
+        if not match:
+            continue
+        try:
+            price = float(match.group(2).strip().replace(",", ""))
+        except ValueError:
+            continue
+
+        change_val = 0
+        try:
+            # Parent container ~ enclosing <div> around the price span
+            start = html.rfind("<div", 0, match.start())
+            end = html.find("</div>", match.end())
+            container = html[max(start, 0):end if end != -1 else match.end()]
+            text = unescape(TAG_RE.sub("", container))
+            change_val = _parse_change(text, 'C($c-trend-down)' in container)
+        except Exception:
+            pass
+        return price, change_val
+    return None
+
+def parse_yahoo_quote_dom(html: str):
+    """
+    Slow path: full BeautifulSoup parse. Returns (price, change) or None.
+    """
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, "html.parser")
+    
+    # Selectors for Price (Big Number)
+    # Yahoo TW classes often use Fz(32px) for the main price
+    selectors = [".Fz\\(32px\\)", ".Fz\\(42px\\)", "[class*='Fz(32px)']", "[class*='Fz(42px)']"]
+    
+    price = None
+    for sel in selectors:
+        tag = soup.select_one(sel)
+        if tag:
+            try:
+                txt = tag.text.strip().replace(",", "")
+                price = float(txt)
+                break 
+            except:
+                continue
+    
+    if not price:
+        return None
+
+    # Try to scrape Change
+    change_val = 0
+    try:
+        container = soup.select_one(".Fz\\(32px\\)").parent
+        if container:
+            is_down = container.select_one('[class*="C($c-trend-down)"]') is not None
+            change_val = _parse_change(container.text, is_down)
+    except:
+        pass
+    return price, change_val
+
+async def fetch_yahoo_quote(symbol: str):
     """
-    Scrape Yahoo Finance TW for real-time Futures data (Day + Night).
+    Scrape Yahoo Finance TW for the real-time price and day change (Day + Night).
     Target: https://tw.stock.yahoo.com/quote/{symbol}
+    Returns (price, change) or None.
     """
+    # Concurrent scrapes of the same quote page share one request
+    return await coalesce(("realtime", symbol), lambda: _scrape_yahoo_quote(symbol))
+
+async def _scrape_yahoo_quote(symbol: str):
     try:
         url = f"https://tw.stock.yahoo.com/quote/{symbol}"
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-        }
         print(f"🕵️ Scraping Real-Time Data from {url}...")
-        res = requests.get(url, headers=headers, timeout=5)
+        async with _upstream_limit:
+            res = await get_http_client().get(url)
         
         if res.status_code != 200:
             return None
-            
-        soup = BeautifulSoup(res.text, "html.parser")
-        
-        # Selectors for Price (Big Number)
-        # Yahoo TW classes often use Fz(32px) for the main price
-        selectors = [".Fz\\(32px\\)", ".Fz\\(42px\\)", "[class*='Fz(32px)']", "[class*='Fz(42px)']"]
-        
-        price = None
-        for sel in selectors:
-            tag = soup.select_one(sel)
-            if tag:
-                try:
-                    txt = tag.text.strip().replace(",", "")
-                    price = float(txt)
-                    break 
-                except:
-                    continue
-        
-        if price:
-            print(f"✅ Scraped Price: {price}")
-            
-            # Try to scrape Change
-            change_val = 0
-            try:
-                container = soup.select_one(".Fz\\(32px\\)").parent
-                if container:
-                    import re
-                    match = re.search(r'([▲▼\+\-]?\s*\d+\.?\d*)\s*\(.*?%\)', container.text)
-                    if match:
-                        change_str = match.group(1).replace("▲", "").replace("▼", "").replace("+", "").replace(",", "").strip()
-                        change_val = float(change_str)
-                        change_val = float(change_str)
-                        
-                        # Determine sign using robust class detection
-                        is_down = container.select_one('[class*="C($c-trend-down)"]') is not None
-                        
-                        if is_down:
-                            change_val = -abs(change_val)
-                        else:
-                            change_val = abs(change_val)
-            except:
-                pass
-            
-            print(f"✅ Scraped Change: {change_val}")
 
-            # Create a minimal DataFrame
-            data = {
-                "Open": [price], "High": [price], "Low": [price], "Close": [price], "Volume": [0],
-                "DayChange": [change_val] # Store change here
-            }
-            df = pd.DataFrame(data)
-            df.index = [pd.Timestamp.now()]
-            return df
-            
+        quote = extract_yahoo_quote(res.text)
+        if quote is None:
+            # Markup changed? Full DOM parse is CPU-bound, keep it off the event loop
+            quote = await run_blocking(parse_yahoo_quote_dom, res.text)
+        if quote is None:
+            return None
+
+        print(f"✅ Scraped Price: {quote[0]}")
+        print(f"✅ Scraped Change: {quote[1]}")
+        return quote
     except Exception as e:
         print(f"⚠️ Scraping Failed: {e}")
         return None
 
+async def fetch_yahoo_realtime(symbol: str):
+    """
+    Real-time quote as a minimal one-row OHLCV DataFrame (for history patching / fallback).
+    """
+    quote = await fetch_yahoo_quote(symbol)
+    if quote is None:
+        return None
+    price, change_val = quote
+
+    # Create a minimal DataFrame
+    data = {
+        "Open": [price], "High": [price], "Low": [price], "Close": [price], "Volume": [0],
+        "DayChange": [change_val] # Store change here
+    }
+    df = pd.DataFrame(data)
+    df.index = [pd.Timestamp.now()]
+    return df
+
+def download_history(ticker: str, **kwargs) -> pd.DataFrame:
+    """
+    Raw yfinance download (with one retry on empty data).
+    kwargs are passed to history(), e.g. period="5y" or start="2024-01-02".
+    """
+    import yfinance as yf
+    data = yf.Ticker(ticker)
+    df = data.history(auto_adjust=False, **kwargs)
+    
+    if df.empty:
+        print(f"⚠️ Empty data, retrying {ticker}...")
+        data = yf.Ticker(ticker)
+        df = data.history(auto_adjust=False, **kwargs)
+    
+    return df
+
 async def fetch_history_internal(symbol: str, period: str = "1y") -> pd.DataFrame:
     """
     The original robust yfinance fetcher with SSL/Cache fixes.
     """
     ticker = SYMBOL_MAP.get(symbol.upper(), symbol)
-    print(f"📡 API Fetching: {ticker} ({period})...")
-
-    # 1. Fix Certificate Path (Crucial for Windows/Chinese Paths)
-    safe_cert_path = "C:\\Users\\Public\\wealth_os_cacert.pem"
-    try:
-        if not os.path.exists(safe_cert_path):
-            shutil.copy(certifi.where(), safe_cert_path)
-        os.environ['CURL_CA_BUNDLE'] = safe_cert_path
-        os.environ['SSL_CERT_FILE'] = safe_cert_path
-        os.environ['REQUESTS_CA_BUNDLE'] = safe_cert_path
-    except Exception as e:
-        print(f"⚠️ SSL Fix Failed: {e}")
+    # MTX and TAIEX both resolve to ^TWII, so coalesce on the resolved ticker
+    return await coalesce(("ticker", ticker, period), lambda: _fetch_ticker_history(ticker, period))
 
-    # 2. Fix Cache Path
-    try:
-        safe_cache_path = "C:\\Users\\Public\\yfinance_cache"
-        if not os.path.exists(safe_cache_path):
-             os.makedirs(safe_cache_path)
-        os.environ['YFINANCE_CACHE_DIR'] = safe_cache_path
-    except Exception as e:
-        print(f"⚠️ Cache Fix Failed: {e}")
+async def _fetch_ticker_history(ticker: str, period: str) -> pd.DataFrame:
+    print(f"📡 API Fetching: {ticker} ({period})...")
+    setup_environment()
 
     try:
-        data = yf.Ticker(ticker)
-        df = data.history(period=period, auto_adjust=False)
-        
-        if df.empty:
-            print(f"⚠️ Empty data, retrying {ticker}...")
-            data = yf.Ticker(ticker)
-            df = data.history(period=period, auto_adjust=False)
+        # Served from the local price store; only the missing tail hits yfinance
+        df = await run_blocking(get_history, ticker, period, download_history)
         
         if df.empty:
              raise ValueError(f"No data found for {ticker}")
@@ -151,19 +303,44 @@ async def fetch_history_internal(symbol: str, period: str = "1y") -> pd.DataFram
 
 async def fetch_price_history(symbol: str, period: str = "1y") -> pd.DataFrame:
     """
-    Main Entry Point. Routes symbols to scrapers if yfinance fails or is rate-limited.
+    Main Entry Point. Served from the in-process cache when a fresh frame
+    for the same (or a longer) period is already held, then from the
+    host-wide cache shared by all workers.
+    """
+    cached = price_cache.get(symbol, period)
+    if cached is not None:
+        return cached
+
+    # Concurrent misses for the same (symbol, period) share one upstream fetch
+    return await coalesce(("history", symbol, period), lambda: _fetch_and_cache(symbol, period))
+
+async def _fetch_and_cache(symbol: str, period: str) -> pd.DataFrame:
+    # MTX carries the live night-session tick, so keep it only briefly
+    ttl = LIVE_CACHE_TTL if symbol == "MTX" else price_cache.ttl
+    # Host-wide cache: one worker fetches upstream, the others reuse its frame
+    df, age = await shared_fetch(("history", symbol, period), ttl, lambda: fetch_price_history_uncached(symbol, period))
+    price_cache.put(symbol, period, df, ttl=ttl - age)
+    return df
+
+async def fetch_price_history_uncached(symbol: str, period: str = "1y") -> pd.DataFrame:
+    """
+    Routes symbols to scrapers if yfinance fails or is rate-limited.
     """
     # Special Handling for Mini-Taiex (Live Night Session)
     if symbol == "MTX":
         print("🌙 Fetching Night Market Data for Mini-Taiex...")
-        live_df = fetch_yahoo_realtime("WTX%26") 
-        history_df = None
-        try:
-            history_df = await fetch_history_internal("MTX", period=period)
-        except:
-            pass
+        # Scrape and history download run concurrently
+        live_df, history_df = await asyncio.gather(
+            fetch_yahoo_realtime("WTX%26"),
+            fetch_history_internal("MTX", period=period),
+            return_exceptions=True
+        )
+        if isinstance(live_df, BaseException): live_df = None
+        if isinstance(history_df, BaseException): history_df = None
             
         if live_df is not None and history_df is not None:
+             # Own copy: the cached ^TWII frame is shared with every other caller
+             history_df = history_df.copy()
              last_idx = history_df.index[-1]
              live_price = live_df['Close'].iloc[0]
              history_df.at[last_idx, 'Close'] = live_price
@@ -186,83 +363,97 @@ async def fetch_price_history(symbol: str, period: str = "1y") -> pd.DataFrame:
         if ".TW" in str(SYMBOL_MAP.get(symbol.upper(), symbol)):
             print(f"⚠️ yfinance failed for {symbol}, trying scraper fallback...")
             ticker = SYMBOL_MAP.get(symbol.upper(), symbol)
-            live_df = fetch_yahoo_realtime(ticker)
+            live_df = await fetch_yahoo_realtime(ticker)
             if live_df is not None:
                 return live_df
         # Re-raise if no fallback worked
         raise e
 
-import math
-
-# --- Black-Scholes Helper ---
-def cnd(x):
-    """Cumulative Normal Distribution"""
-    return (1.0 + math.erf(x / math.sqrt(2.0))) / 2.0
-
-def calculate_bs_put(S, K, T, r, sigma):
-    """
-    Calculate Put Option Price using Black-Scholes Model
-    S: Spot Price
-    K: Strike Price
-    T: Time to Maturity (years)
-    r: Risk Free Rate (decimal)
-    sigma: Volatility (decimal)
-    """
-    if T <= 0 or sigma <= 0: return max(0, K - S)
-    
-    d1 = (math.log(S / K) + (r + 0.5 * sigma ** 2) * T) / (sigma * math.sqrt(T))
-    d2 = d1 - sigma * math.sqrt(T)
-    
-    put_price = K * math.exp(-r * T) * cnd(-d2) - S * cnd(-d1)
-    return max(0, put_price)
+# --- OPTIONS ADVISOR ---
+# Put chain around the index: strikes every 100 points from 2000 below to
+# 1000 above the ATM strike, weekly and monthly expiries.
+CHAIN_STEP = 100
+CHAIN_BELOW = 2000
+CHAIN_ABOVE = 1000
+CHAIN_EXPIRIES = [("weekly", 5), ("monthly", 20)]
 
 async def fetch_options_summary(index_price: float):
     """
     V5 Helper: Calculate nearest OTM Puts for insurance.
-    Returns Weekly, Monthly 500, and Monthly 1000 OTM targets.
+    Returns Weekly, Monthly 500, and Monthly 1000 OTM targets, plus the full
+    put chain (price + Greeks) priced as one strike x expiry grid.
+    IV comes from the latest option-chain snapshot surface when one is recent enough
+    (MAX_SNAPSHOT_AGE), otherwise the fixed fallback.
     """
     try:
         # Parameters
         r = 0.015  # Risk Free Rate (1.5%)
-        sigma = 0.20 # Implied Volatility (Assuming 20% for conservative estimate)
+        sigma = 0.20 # Fallback IV (conservative estimate) when no snapshot covers a strike
         
         # Round to nearest 100
         base_strike = round(index_price / 100) * 100
-        
+        strikes = np.arange(base_strike - CHAIN_BELOW, base_strike + CHAIN_ABOVE + 1, CHAIN_STEP)
+        days = np.array([d for _, d in CHAIN_EXPIRIES])
+
+        # Smile from the snapshot surface, in moneyness so it follows the live index
+        surface = await run_blocking(current_surface)
+        iv_source = "fixed"
+        iv = np.full((len(days), len(strikes)), sigma)
+        if surface is not None:
+            surface_iv = surface.iv(strikes[None, :] * surface.spot / index_price, days[:, None])
+            iv = np.where(np.isfinite(surface_iv), surface_iv, sigma)
+            iv_source = f"surface {surface.date.date()}"
+
+        # One call for the whole grid: rows = expiries, columns = strikes
+        greeks = bs_greeks(index_price, strikes[None, :], days[:, None] / 365, r, iv, is_call=False)
+
+        def put_quote(expiry_row, strike):
+            col = np.searchsorted(strikes, strike)
+            return {
+                "price": round(float(greeks['price'][expiry_row, col]), 1),
+                "iv": round(float(iv[expiry_row, col]) * 100, 1)
+            }
+
         # 1. Weekly OTM (approx 200 points out) - 5 Days left
         w_strike = base_strike - 200
-        w_price = calculate_bs_put(index_price, w_strike, 5/365, r, sigma)
-        
         # 2. Monthly OTM 500 - 20 Days left
         m500_strike = base_strike - 500
-        m500_price = calculate_bs_put(index_price, m500_strike, 20/365, r, sigma)
-        
         # 3. Monthly OTM 1000 - 20 Days left
         m1000_strike = base_strike - 1000
-        m1000_price = calculate_bs_put(index_price, m1000_strike, 20/365, r, sigma)
+
+        digits = {"price": 1, "delta": 4, "gamma": 6, "vega": 2, "theta": 2, "rho": 2}
+        chain = {
+            "strikes": strikes.tolist(),
+            "iv_source": iv_source,
+            "expiries": [
+                {
+                    "label": label,
+                    "days": int(d),
+                    "iv": np.round(iv[row] * 100, 1).tolist(),
+                    **{k: np.round(greeks[k][row], n).tolist() for k, n in digits.items()}
+                }
+                for row, (label, d) in enumerate(CHAIN_EXPIRIES)
+            ]
+        }
         
         return {
             "weekly": {
                 "strike": f"{w_strike} P",
-                "price": round(w_price, 1),
-                "iv": round(sigma * 100, 1)
+                **put_quote(0, w_strike)
             },
             "monthly_500": {
                 "label": "月 500 避險",
                 "strike": f"{m500_strike} P",
-                "price": round(m500_price, 1),
-                "iv": round(sigma * 100, 1)
+                **put_quote(1, m500_strike)
             },
             "monthly_1000": {
                 "label": "月 1000 避險",
                 "strike": f"{m1000_strike} P",
-                "price": round(m1000_price, 1),
-                "iv": round(sigma * 100, 1)
-            }
+                **put_quote(1, m1000_strike)
+            },
+            "iv_source": iv_source,
+            "chain": chain
         }
     except Exception as e:
         print(f"Error calculating options: {e}")
         return None
-
-# Normal Flow
-    return await fetch_history_internal(symbol, period)
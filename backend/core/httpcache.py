@@ -0,0 +1,55 @@
+import os
+import hashlib
+import pandas as pd
+from fastapi import Request
+from fastapi.responses import Response
+
+# --- HTTP CONDITIONAL REQUESTS ---
+# Analysis results are a pure function of (endpoint, symbol, price frame,
+# params), so the ETag is derived from those inputs before any engine runs.
+# A matching If-None-Match is answered with an empty 304 and the engine is
+# skipped entirely; browsers and the reverse proxy keep the body.
+
+# Bump to invalidate every client-side copy after an engine change
+ETAG_VERSION = os.environ.get("WEALTH_OS_ETAG_VERSION", "1")
+
+# Seconds a response may be reused without revalidation
+ANALYZE_MAX_AGE = int(os.environ.get("WEALTH_OS_ANALYZE_MAX_AGE", "5"))
+SIMULATE_MAX_AGE = int(os.environ.get("WEALTH_OS_SIMULATE_MAX_AGE", "60"))
+
+def frame_tag(df: pd.DataFrame):
+    """Identity of a price frame: bar range plus every value of the last (possibly live) bar."""
+    if df is None or df.empty:
+        return None
+    return (len(df), str(df.index[0]), str(df.index[-1]), tuple(map(str, df.iloc[-1].tolist())))
+
+def make_etag(*parts) -> str:
+    digest = hashlib.blake2b(repr((ETAG_VERSION,) + parts).encode(), digest_size=12).hexdigest()
+    # Weak: the body is equivalent, not byte-identical, once gzip/brotli is applied
+    return f'W/"{digest}"'
+
+def _matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # Weak comparison (RFC 9110): ignore the W/ prefix on both sides
+    tags = {t.strip().removeprefix("W/") for t in header.split(",")}
+    return etag.removeprefix("W/") in tags
+
+def _cache_control(max_age: int) -> str:
+    return f"public, max-age={max_age}, stale-while-revalidate={max_age * 2}"
+
+def not_modified(request: Request, etag: str, max_age: int):
+    """304 response when the client already holds this ETag, else None."""
+    if not _matches(request, etag):
+        return None
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": _cache_control(max_age)})
+
+def cache_headers(content, response: Response, etag: str, max_age: int):
+    """Attach ETag / Cache-Control to a Response, or to FastAPI's response for plain dicts."""
+    target = content if isinstance(content, Response) else response
+    target.headers["ETag"] = etag
+    target.headers["Cache-Control"] = _cache_control(max_age)
+    return content
@@ -0,0 +1,288 @@
+import math
+import threading
+from collections import deque, OrderedDict
+import numpy as np
+import pandas as pd
+
+# --- INCREMENTAL INDICATOR STATE ---
+# Monitor mode re-analyses the same symbols every few seconds while usually
+# only the last (live) bar moved. Each (symbol, MA params) keeps its rolling
+# sums, EMA state and variance accumulators for every closed bar; the open
+# last bar is evaluated on top of that state without changing it, so a
+# revised tick costs O(1) and a new bar is folded in O(1).
+# Same definitions as the pandas versions (rolling mean, 14-bar SMA RSI,
+# EMA 12/26/9 with adjust=False, 20-bar sample std of log returns).
+
+CHART_BARS = 90
+MAX_STATES = 64
+
+class RollingSum:
+    """Fixed-window sum / sum of squares, NaN until the window is full."""
+
+    def __init__(self, window: int):
+        self.window = window
+        self.values = deque()
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.zeros = 0
+        self.pushes = 0
+
+    def _with(self, x: float):
+        """(total, total_sq, count) as if x were appended."""
+        total, total_sq, zeros, count = self.total + x, self.total_sq + x * x, self.zeros + (x == 0), len(self.values) + 1
+        if count > self.window:
+            old = self.values[0]
+            total, total_sq, zeros, count = total - old, total_sq - old * old, zeros - (old == 0), count - 1
+        if zeros == count:
+            total = total_sq = 0.0   # all-zero window: no cancellation residue
+        return total, total_sq, count
+
+    def mean(self, x: float) -> float:
+        total, _, count = self._with(x)
+        return total / count if count == self.window else math.nan
+
+    def std(self, x: float) -> float:
+        total, total_sq, count = self._with(x)
+        if count < self.window or count < 2:
+            return math.nan
+        var = (total_sq - total * total / count) / (count - 1)
+        return math.sqrt(max(var, 0.0))
+
+    def push(self, x: float):
+        self.values.append(x)
+        self.total += x
+        self.total_sq += x * x
+        self.zeros += x == 0
+        if len(self.values) > self.window:
+            old = self.values.popleft()
+            self.total -= old
+            self.total_sq -= old * old
+            self.zeros -= old == 0
+        self.pushes += 1
+        if self.pushes % self.window == 0:
+            # Re-anchor the running sums once per window so rounding never accumulates
+            self.total = math.fsum(self.values)
+            self.total_sq = math.fsum(v * v for v in self.values)
+
+class Ema:
+    """Exponential moving average, pandas ewm(span, adjust=False) recurrence."""
+
+    def __init__(self, span: int):
+        self.alpha = 2.0 / (span + 1)
+        self.value = None
+
+    def peek(self, x: float) -> float:
+        if self.value is None:
+            return x
+        return (1 - self.alpha) * self.value + self.alpha * x
+
+    def push(self, x: float):
+        self.value = self.peek(x)
+
+class IndicatorState:
+    """
+    Indicator state for one symbol and MA setting.
+    `update(index, close)` syncs with a price frame and returns the latest
+    values plus the MA columns for the chart window.
+    """
+
+    def __init__(self, short_ma: int = 20, long_ma: int = 60):
+        self.short_ma = short_ma
+        self.long_ma = long_ma
+        self.rebuilds = 0
+        self.folds = 0
+        self._reset()
+
+    def _reset(self):
+        self.ma = {"ma_ultra_short": RollingSum(10), "ma_short": RollingSum(self.short_ma), "ma_long": RollingSum(self.long_ma)}
+        self.gain = RollingSum(14)
+        self.loss = RollingSum(14)
+        self.log_ret = RollingSum(20)
+        self.ema12 = Ema(12)
+        self.ema26 = Ema(26)
+        self.signal = Ema(9)
+        # First bar the state was seeded from; last closed bar folded into it
+        self.first_ts = None
+        self.last_ts = None
+        self.last_close = None
+        self.chart = deque(maxlen=CHART_BARS - 1)
+
+    def _evaluate(self, close: float) -> dict:
+        """Indicators for a bar with this close on top of the closed-bar state (no mutation)."""
+        row = {name: roll.mean(close) for name, roll in self.ma.items()}
+        prev = self.last_close
+        if prev is None:
+            row.update(rsi=math.nan, hv=math.nan)
+        else:
+            delta = close - prev
+            gain, loss = self.gain.mean(max(delta, 0.0)), self.loss.mean(max(-delta, 0.0))
+            if loss == 0:
+                rs = math.inf if gain > 0 else math.nan
+            else:
+                rs = gain / loss
+            row['rsi'] = 100 - (100 / (1 + rs))
+            std = self.log_ret.std(math.log(close / prev))
+            row['hv'] = std * math.sqrt(252) * 100
+        row['macd'] = self.ema12.peek(close) - self.ema26.peek(close)
+        row['signal_line'] = self.signal.peek(row['macd'])
+        return row
+
+    def _fold(self, ts, close: float):
+        """Close a bar: push it into every accumulator."""
+        row = self._evaluate(close)
+        for roll in self.ma.values():
+            roll.push(close)
+        if self.last_close is not None:
+            delta = close - self.last_close
+            self.gain.push(max(delta, 0.0))
+            self.loss.push(max(-delta, 0.0))
+            self.log_ret.push(math.log(close / self.last_close))
+        self.ema12.push(close)
+        self.ema26.push(close)
+        self.signal.push(row['macd'])
+        self.chart.append(row)
+        self.last_ts = ts
+        self.last_close = close
+        self.folds += 1
+
+    def update(self, index: pd.Index, close: np.ndarray) -> dict:
+        n = len(close)
+        start = 0
+        if self.last_ts is not None and index[0] == self.first_ts:
+            # Resume after the last closed bar if the frame starts at the same bar and still agrees with it
+            pos = index.searchsorted(self.last_ts)
+            if pos < n - 1 and index[pos] == self.last_ts and close[pos] == self.last_close:
+                start = pos + 1
+        if start == 0:
+            # First call, a different start bar (e.g. other period), or history was
+            # revised / no longer contains our bar: warm-up must match a from-scratch run
+            self._reset()
+            self.first_ts = index[0]
+            self.rebuilds += 1
+
+        for i in range(start, n - 1):
+            self._fold(index[i], float(close[i]))
+
+        # Open bar: evaluated on top of the state, never folded until a newer bar exists
+        latest = self._evaluate(float(close[-1]))
+        return {"latest": latest, "chart": list(self.chart) + [latest]}
+
+def frame_snapshot(close: np.ndarray, short_ma: int = 20, long_ma: int = 60) -> dict:
+    """
+    Same result as a fresh IndicatorState(...).update(), vectorized: one-off
+    requests (no symbol) pay a few pandas passes instead of a Python loop per bar.
+    """
+    s = pd.Series(close)
+    delta = s.diff()
+    gain = delta.clip(lower=0).rolling(window=14).mean()
+    loss = (-delta).clip(lower=0).rolling(window=14).mean()
+    macd = s.ewm(span=12, adjust=False).mean() - s.ewm(span=26, adjust=False).mean()
+    columns = {
+        "ma_ultra_short": s.rolling(window=10).mean(),
+        "ma_short": s.rolling(window=short_ma).mean(),
+        "ma_long": s.rolling(window=long_ma).mean(),
+        "rsi": 100 - (100 / (1 + gain / loss)),
+        "hv": np.log(s / s.shift(1)).rolling(window=20).std() * math.sqrt(252) * 100,
+        "macd": macd,
+        "signal_line": macd.ewm(span=9, adjust=False).mean(),
+    }
+    tail = {name: col.to_numpy()[-CHART_BARS:].tolist() for name, col in columns.items()}
+    chart = [dict(zip(tail, row)) for row in zip(*tail.values())]
+    return {"latest": chart[-1], "chart": chart}
+
+_states = OrderedDict()
+_states_lock = threading.Lock()
+
+def indicator_snapshot(symbol, df: pd.DataFrame, short_ma: int = 20, long_ma: int = 60) -> dict:
+    """
+    Latest indicators + chart MA columns for a price frame.
+    With a symbol the state is kept between calls; without one it is computed from scratch.
+    """
+    close = df['Close'].to_numpy(dtype=np.float64)
+    if symbol is None:
+        return frame_snapshot(close, short_ma, long_ma)
+
+    key = (symbol, short_ma, long_ma)
+    with _states_lock:
+        state = _states.get(key)
+        if state is None:
+            state = _states[key] = IndicatorState(short_ma, long_ma)
+        _states.move_to_end(key)
+        while len(_states) > MAX_STATES:
+            _states.popitem(last=False)
+        return state.update(df.index, close)
+
+# --- SHARED INDICATOR ARRAYS ---
+# Engines read close/high/low as read-only arrays and get indicator arrays
+# back instead of adding columns to the frame, so one cached price frame is
+# shared by every concurrent request. Results are memoized per frame
+# identity (symbol, bar range, last bar + close) and indicator params, and
+# handed out read-only as well.
+
+MAX_MEMO_ENTRIES = 256
+
+def read_only(values: np.ndarray) -> np.ndarray:
+    values.setflags(write=False)
+    return values
+
+def price_arrays(df: pd.DataFrame) -> dict:
+    """Read-only float64 close / high / low columns (no copy when already float64)."""
+    return {
+        col.lower(): read_only(df[col].to_numpy(dtype=np.float64))
+        for col in ('Close', 'High', 'Low') if col in df.columns
+    }
+
+def sma(close: np.ndarray, window: int) -> np.ndarray:
+    """Simple moving average (pandas rolling().mean() numerics)."""
+    return pd.Series(close).rolling(window=window).mean().to_numpy()
+
+def hv(close: np.ndarray, window: int = 20) -> np.ndarray:
+    """Annualised historical volatility of log returns, in percent."""
+    log_ret = pd.Series(np.log(close[1:] / close[:-1]))
+    vol = log_ret.rolling(window=window).std().to_numpy() * np.sqrt(252) * 100
+    return np.concatenate(([np.nan], vol))
+
+INDICATORS = {
+    "sma": sma,
+    "hv": hv,
+}
+
+_memo = OrderedDict()
+_memo_lock = threading.Lock()
+_memo_stats = {"hits": 0, "misses": 0}
+
+def frame_key(symbol, df: pd.DataFrame):
+    """Identity of a price frame: same symbol, bar range and last close -> same indicators."""
+    if symbol is None or df.empty:
+        return None
+    return (symbol, len(df), df.index[0], df.index[-1], float(df['Close'].iloc[-1]))
+
+def indicator(symbol, df: pd.DataFrame, name: str, *params) -> np.ndarray:
+    """
+    Read-only indicator array for a price frame, e.g. indicator("0050", df, "sma", 60).
+    Memoized when a symbol is given; without one it is computed directly.
+    """
+    fn = INDICATORS[name]
+    base = frame_key(symbol, df)
+    if base is None:
+        return read_only(fn(price_arrays(df)['close'], *params))
+
+    key = base + (name, params)
+    with _memo_lock:
+        values = _memo.get(key)
+        if values is not None:
+            _memo.move_to_end(key)
+            _memo_stats["hits"] += 1
+            return values
+        _memo_stats["misses"] += 1
+
+    values = read_only(fn(price_arrays(df)['close'], *params))
+    with _memo_lock:
+        _memo[key] = values
+        while len(_memo) > MAX_MEMO_ENTRIES:
+            _memo.popitem(last=False)
+    return values
+
+def indicator_stats() -> dict:
+    with _memo_lock:
+        return {"entries": len(_memo), **_memo_stats, "states": len(_states)}
@@ -1,171 +1,138 @@
-import math
 import numpy as np
 import pandas as pd
-from typing import List, Dict
+from core.pricing import bs_price
+from core.volsurface import surface_iv_series
+from core.indicators import indicator, price_arrays
+from core.payload import time_vector
 
-# --- BLACK-SCHOLES ENGINE ---
-
-def cnd(x):
-    """Cumulative Normal Distribution"""
-    return (1.0 + math.erf(x / math.sqrt(2.0))) / 2.0
-
-def calculate_bs_price(S, K, T, r, sigma, option_type="call"):
-    """
-    Calculate Option Price (Call or Put)
-    Safeguarded against math domain errors.
-    """
-    try:
-        if S <= 0 or K <= 0: return 0.0
-        if T <= 0 or sigma <= 0: 
-            if option_type == "call": return max(0.0, S - K)
-            else: return max(0.0, K - S)
-        
-        d1 = (math.log(S / K) + (r + 0.5 * sigma ** 2) * T) / (sigma * math.sqrt(T))
-        d2 = d1 - sigma * math.sqrt(T)
-        
-        if option_type == "call":
-            price = S * cnd(d1) - K * math.exp(-r * T) * cnd(d2)
-        else:
-            price = K * math.exp(-r * T) * cnd(-d2) - S * cnd(-d1)
-            
-        return max(0.0, price)
-    except ValueError:
-        return 0.0
-    except Exception:
-        return 0.0
-
-def run_vol_backtest(df: pd.DataFrame, initial_capital: float = 100000, strategy_days: int = 7) -> dict:
+def run_vol_backtest(df: pd.DataFrame, initial_capital: float = 100000, strategy_days: int = 7, symbol: str = None, columnar: bool = False) -> dict:
     """
     Simulate Options Volatility Strategy based on HV20 signals.
+    Fixed duration trades (Weekly Options logic): enter on a vol regime signal,
+    hold `strategy_days` bars to expiry, no overlapping trades.
+    Low HV (< 15) -> Long ATM Straddle, High HV (> 25) -> Short 200pt OTM Strangle.
+    Array based: signals in one pass, entries found by skipping through signal
+    indices, every leg priced in one vectorized Black-Scholes call.
+    Legs are priced at the snapshot IV surface (data/options) where one covers
+    the entry date, otherwise HV20 stands in for IV.
+    columnar=True returns equity_curve / trades as arrays (see core.payload).
     """
-    # 1. Ensure HV20 exists
-    if 'HV20' not in df.columns:
-        df['Log_Ret'] = np.log(df['Close'] / df['Close'].shift(1))
-        df['HV20'] = df['Log_Ret'].rolling(window=20).std() * np.sqrt(252) * 100
-
-    # 2. Parameters
     r = 0.015 # 1.5% Risk Free Rate
-    
-    trades = []
-    equity_curve = [initial_capital]
-    active_trade = None
-    
-    # Iterate through history
-    # We simulate entering a trade and holding it for "strategy_days" or until signal flips?
-    # Let's simple: Fixed duration trade (Weekly Options logic)
-    
-    for i in range(20, len(df) - strategy_days):
-        date = df.index[i]
-        row = df.iloc[i]
-        
-        # Check if we have an active trade expiring today
-        if active_trade and i == active_trade['exit_idx']:
-            # CLOSE TRADE
-            exit_S = row['Close']
-            exit_vol = row['HV20'] / 100 # Use realized vol at exit as proxy for IV? 
-            # Or use initial vol? For PnL attribution, usually implied vol change matters.
-            # Simplified: Assume IV reverted to mean or use current HV.
-            # Let's use current HV as proxy for IV at exit.
-            
-            T_remaining = 0 # Expired
-            
-            # Theoretical Exit Price (Intrinsinc Value if T=0)
-            call_exit = calculate_bs_price(exit_S, active_trade['strike'], 0, r, exit_vol, "call")
-            put_exit = calculate_bs_price(exit_S, active_trade['strike'], 0, r, exit_vol, "put")
-            
-            total_exit_value = 0
-            
-            if active_trade['type'] == 'LONG_STRADDLE':
-                # Bought Call + Put. Value is what we sell them for.
-                total_exit_value = call_exit + put_exit
-                pnl = (total_exit_value - active_trade['entry_cost']) * 50 # 50 = Multiplier (Mini-Index)
-                
-            elif active_trade['type'] == 'SHORT_STRANGLE':
-                # Sold Call + Put. Cost is what we buy them back for.
-                # Here we assume we held to expiration (0 days).
-                # PnL = Credit Received - Buyback Cost
-                buyback_cost = call_exit + put_exit
-                pnl = (active_trade['credit_received'] - buyback_cost) * 50
-                
-            active_trade['pnl'] = pnl
-            active_trade['exit_price'] = exit_S
-            active_trade['exit_date'] = str(date.date())
-            trades.append(active_trade)
-            
-            current_equity = equity_curve[-1] + pnl
-            equity_curve.append(current_equity)
-            active_trade = None
-            continue
-            
-        # If no active trade, look for entry
-        if active_trade is None:
-            hv = row['HV20']
-            S = row['Close']
-            
-            # SIGNAL LOGIC
-            signal = "NEUTRAL"
-            if hv < 15: signal = "LONG_STRADDLE" # Low Vol -> Buy
-            elif hv > 25: signal = "SHORT_STRANGLE" # High Vol -> Sell
-            
-            if signal != "NEUTRAL":
-                # ENTER TRADE
-                # 7 Days to maturity
-                T = strategy_days / 365.0
-                sigma = hv / 100.0 # Use current HV as proxy for IV pricing
-                
-                # ATM Strike
-                strike = round(S / 50) * 50
-                
-                if signal == "LONG_STRADDLE":
-                    c_price = calculate_bs_price(S, strike, T, r, sigma, "call")
-                    p_price = calculate_bs_price(S, strike, T, r, sigma, "put")
-                    cost = c_price + p_price
-                    
-                    active_trade = {
-                        "entry_idx": i,
-                        "exit_idx": i + strategy_days,
-                        "entry_date": str(date.date()),
-                        "type": "LONG_STRADDLE",
-                        "strike": strike,
-                        "entry_S": S,
-                        "entry_vol": hv,
-                        "entry_cost": cost,
-                        "pnl": 0
-                    }
-                    
-                elif signal == "SHORT_STRANGLE":
-                    # Sell OTM Strangle (approx Delta 0.2? Simpler: 200 points out)
-                    c_strike = strike + 200
-                    p_strike = strike - 200
-                    
-                    c_price = calculate_bs_price(S, c_strike, T, r, sigma, "call")
-                    p_price = calculate_bs_price(S, p_strike, T, r, sigma, "put")
-                    credit = c_price + p_price
-                    
-                    active_trade = {
-                        "entry_idx": i,
-                        "exit_idx": i + strategy_days,
-                        "entry_date": str(date.date()),
-                        "type": "SHORT_STRANGLE",
-                        "strike": strike, # Base strike for ref
-                        "entry_S": S,
-                        "entry_vol": hv,
-                        "credit_received": credit,
-                        "pnl": 0
-                    }
-        else:
-             # Just mark equity unchanged for today (simplified)
-             equity_curve.append(equity_curve[-1])
+    multiplier = 50 # Mini-Index
+
+    close = price_arrays(df)['close']
+    hv = df['HV20'].to_numpy(dtype=np.float64) if 'HV20' in df.columns else indicator(symbol, df, "hv", 20)
+    end = len(df) - strategy_days   # last bar (exclusive) the original walk visits
+
+    # 1. Signals (NaN HV compares False -> neutral)
+    long_vol = hv < 15
+    short_vol = hv > 25
+    candidates = np.flatnonzero(long_vol[:max(end, 0)] | short_vol[:max(end, 0)])
+    candidates = candidates[candidates >= 20]
+
+    # 2. Schedule non-overlapping trades: skip to the first signal after each exit
+    entries = []
+    open_entry = None
+    pos = 20
+    while True:
+        k = np.searchsorted(candidates, pos)
+        if k >= len(candidates):
+            break
+        entry = candidates[k]
+        if entry + strategy_days >= end:
+            open_entry = entry # never reaches its exit bar inside the walk
+            break
+        entries.append(entry)
+        pos = entry + strategy_days + 1 # exit bar closes the trade, next entry from the day after
+
+    entry_idx = np.asarray(entries, dtype=np.int64)
+    exit_idx = entry_idx + strategy_days
+    is_long = long_vol[entry_idx]
+
+    # 3. Price all legs at once
+    S = close[entry_idx]
+    strike = np.round(S / 50) * 50 # ATM Strike
+    T = strategy_days / 365.0
+    # Straddle: ATM call + put. Strangle: 200 points OTM each side.
+    call_strike = np.where(is_long, strike, strike + 200)
+    put_strike = np.where(is_long, strike, strike - 200)
+    entry_dates = df.index[entry_idx]
+    call_iv = surface_iv_series(entry_dates, strategy_days, call_strike / S)
+    put_iv = surface_iv_series(entry_dates, strategy_days, put_strike / S)
+    from_surface = np.isfinite(call_iv) & np.isfinite(put_iv)
+    sigma = hv[entry_idx] / 100.0  # Use current HV as proxy for IV pricing
+    call_sigma = np.where(from_surface, call_iv, sigma)
+    put_sigma = np.where(from_surface, put_iv, sigma)
+    premium = bs_price(S, call_strike, T, r, call_sigma, True) + bs_price(S, put_strike, T, r, put_sigma, False)
+
+    # Held to expiry: intrinsic value on the base strike
+    exit_S = close[exit_idx]
+    exit_value = bs_price(exit_S, strike, 0, r, 0, True) + bs_price(exit_S, strike, 0, r, 0, False)
+    pnl = np.where(is_long, exit_value - premium, premium - exit_value) * multiplier
+
+    # 4. Equity: flat while a trade is open, step on each exit bar
+    equity = np.cumsum(np.concatenate(([initial_capital], pnl)))
+    hold = strategy_days - 1
+    segments = [np.array([equity[0]])]
+    if len(entries):
+        steps = np.empty((len(entries), strategy_days))
+        steps[:, :hold] = equity[:-1, None]
+        steps[:, hold] = equity[1:]
+        segments.append(steps.ravel())
+    if open_entry is not None:
+        segments.append(np.full(end - 1 - open_entry, equity[-1]))
+    equity_curve = np.concatenate(segments)
+
+    n_trades = len(entries)
+    if columnar:
+        last = slice(max(n_trades - 50, 0), n_trades) # Last 50 trades
+        trades = {
+            "entry_idx": entry_idx[last],
+            "exit_idx": exit_idx[last],
+            "entry_t": time_vector(df.index[entry_idx[last]]),
+            "exit_t": time_vector(df.index[exit_idx[last]]),
+            "type": np.where(is_long[last], "LONG_STRADDLE", "SHORT_STRANGLE").tolist(),
+            "strike": strike[last].astype(np.int64),
+            "entry_S": S[last],
+            "entry_vol": hv[entry_idx[last]],
+            "entry_iv": np.round((call_sigma[last] + put_sigma[last]) * 50, 2),
+            "iv_source": np.where(from_surface[last], "surface", "hv20").tolist(),
+            "premium": premium[last],
+            "pnl": pnl[last],
+            "exit_price": exit_S[last]
+        }
+    else:
+        dates = [str(d.date()) for d in df.index[np.concatenate((entry_idx, exit_idx))]]
+        trades = []
+        for t in range(n_trades):
+            trade = {
+                "entry_idx": int(entry_idx[t]),
+                "exit_idx": int(exit_idx[t]),
+                "entry_date": dates[t],
+                "type": "LONG_STRADDLE" if is_long[t] else "SHORT_STRANGLE",
+                "strike": int(strike[t]),
+                "entry_S": float(S[t]),
+                "entry_vol": float(hv[entry_idx[t]]),
+                "entry_iv": round(float(call_sigma[t] + put_sigma[t]) * 50, 2),
+                "iv_source": "surface" if from_surface[t] else "hv20",
+            }
+            trade["entry_cost" if is_long[t] else "credit_received"] = float(premium[t])
+            trade["pnl"] = float(pnl[t])
+            trade["exit_price"] = float(exit_S[t])
+            trade["exit_date"] = dates[n_trades + t]
+            trades.append(trade)
+        trades = trades[-50:] # Last 50 trades
 
     # Stats
-    wins = len([t for t in trades if t['pnl'] > 0])
-    total = len(trades)
+    wins = int((pnl > 0).sum())
+    total = n_trades
     win_rate = (wins / total * 100) if total > 0 else 0
     
     return {
-        "final_equity": round(equity_curve[-1], 0),
+        "final_equity": round(float(equity_curve[-1]), 0),
         "total_trades": total,
         "win_rate": round(win_rate, 2),
-        "equity_curve": equity_curve,
-        "trades": trades[-50:] # Last 50 trades
+        "equity_curve": equity_curve if columnar else equity_curve.tolist(),
+        "surface_priced_trades": int(from_surface.sum()),
+        "trades": trades
     }
@@ -0,0 +1,88 @@
+import json
+import struct
+from typing import Literal
+import numpy as np
+import pandas as pd
+from fastapi.responses import Response
+
+try:
+    import orjson
+except ImportError:  # optional: plain json fallback
+    orjson = None
+
+# --- COMPACT RESPONSE FORMATS ---
+# Opt-in alternatives to the row-per-bar JSON the dashboard uses today:
+#   format=columnar  one array per field + one timestamp vector ("t", unix
+#                    seconds); NumPy arrays go straight to orjson.
+#   format=binary    same structure, arrays as raw little-endian buffers:
+#                    b"WOSC" | uint32 header length | JSON header | padding
+#                    to 8 | buffers (8-byte aligned). In the header every
+#                    array is replaced by {"$array": i}; "arrays"[i] gives
+#                    its dtype ("f8" / "i8"), byte offset (from the start of
+#                    the buffer section) and length. NaN stays NaN.
+
+ResponseFormat = Literal["json", "columnar", "binary"]
+BINARY_MEDIA_TYPE = "application/vnd.wealthos.columnar"
+BINARY_MAGIC = b"WOSC"
+
+def time_vector(index: pd.Index) -> np.ndarray:
+    """Bar timestamps as int64 unix seconds."""
+    # asi8 is UTC-based for tz-aware indexes as well
+    return pd.DatetimeIndex(index).as_unit("s").asi8.astype(np.int64)
+
+def rounded(values, digits: int = 2) -> np.ndarray:
+    return np.round(np.asarray(values, dtype=np.float64), digits)
+
+def _contiguous(value):
+    """orjson only serializes C-contiguous arrays natively (reversed slices are views)."""
+    if isinstance(value, np.ndarray) and not value.flags.c_contiguous:
+        return np.ascontiguousarray(value)
+    raise TypeError(f"Not JSON serializable: {type(value)}")
+
+def _to_jsonable(value):
+    """Fallback when orjson is missing: arrays -> lists with NaN -> None."""
+    if isinstance(value, np.ndarray):
+        if value.dtype.kind == 'f':
+            return np.where(np.isnan(value), None, value).tolist()
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Not JSON serializable: {type(value)}")
+
+def dumps(content) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, default=_contiguous, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, default=_to_jsonable, allow_nan=False).encode()
+
+def _extract_arrays(value, arrays: list):
+    if isinstance(value, np.ndarray):
+        arrays.append(value)
+        return {"$array": len(arrays) - 1}
+    if isinstance(value, dict):
+        return {k: _extract_arrays(v, arrays) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_extract_arrays(v, arrays) for v in value]
+    return value
+
+def encode_binary(content) -> bytes:
+    arrays = []
+    header = _extract_arrays(content, arrays)
+    buffers, meta, offset = [], [], 0
+    for values in arrays:
+        dtype = "<f8" if values.dtype.kind == 'f' else "<i8"
+        raw = np.ascontiguousarray(values, dtype=dtype).tobytes()
+        meta.append({"dtype": dtype[1:], "offset": offset, "length": len(values)})
+        buffers.append(raw)
+        offset += len(raw)   # 8-byte items keep every buffer aligned
+
+    head = dumps({"data": header, "arrays": meta})
+    pad = -(len(BINARY_MAGIC) + 4 + len(head)) % 8
+    return b"".join([BINARY_MAGIC, struct.pack("<I", len(head) + pad), head, b" " * pad, *buffers])
+
+def render(content, format: str = "json"):
+    """Response for an engine result in the requested format (plain dicts for json)."""
+    if format == "binary":
+        return Response(encode_binary(content), media_type=BINARY_MEDIA_TYPE)
+    if format == "columnar":
+        return Response(dumps(content), media_type="application/json")
+    return content
@@ -0,0 +1,204 @@
+import os
+import json
+import asyncio
+from core.quotes import fetch_quote, shared_quote, QUOTE_TTL
+from core.portfolio import get_portfolio_summary
+from core.sharedcache import SHARED_CACHE_ENABLED, WORKER_ID, is_leader, put as shared_put, get_prefix
+
+# --- BACKGROUND QUOTE POLLER ---
+# One server-side loop refreshes quotes for the tracked symbols at a fixed
+# cadence and pushes only what changed to every connected dashboard (SSE),
+# so upstream load no longer grows with the number of open browsers.
+# Across gunicorn workers only the leader (core.sharedcache lease) fetches:
+# every worker publishes its tracked symbols host-wide, the leader refreshes
+# their union and the others read the stored quotes, so upstream load does
+# not grow with the worker count either.
+
+POLL_INTERVAL = float(os.environ.get("WEALTH_OS_POLL_INTERVAL", "5"))
+POLLER_ENABLED = os.environ.get("WEALTH_OS_POLLER", "1") != "0"
+SUBSCRIBER_QUEUE_SIZE = 16
+# Upper bound on the polling set (pinned + streamed), so clients cannot grow upstream load
+MAX_TRACKED = int(os.environ.get("WEALTH_OS_MAX_TRACKED", "50"))
+
+# Leadership (and each worker's published symbol set) lapses after this many
+# seconds without a poll, so a dead leader is replaced within a few ticks
+LEADER_TTL = 3 * POLL_INTERVAL
+
+# MTX night session first; portfolio holdings and streamed symbols are appended
+DEFAULT_SYMBOLS = ["MTX"]
+
+_tracked = list(DEFAULT_SYMBOLS)
+# Pinned symbols (MTX + portfolio holdings) stay polled with no subscriber
+_pinned = set(DEFAULT_SYMBOLS)
+# Open streams per symbol; a streamed symbol is dropped when its count hits zero
+_refcount = {}
+_latest = {}
+_subscribers = set()
+_task = None
+
+class TooManySymbols(Exception):
+    pass
+
+def track(symbol: str):
+    """Pin a symbol in the polling set (kept in insertion order, MTX first)."""
+    symbol = symbol.upper()
+    if symbol == "CASH":
+        return
+    _pinned.add(symbol)
+    if symbol not in _tracked:
+        _tracked.append(symbol)
+
+def subscribe(symbols) -> list:
+    """
+    Count one stream subscriber for each symbol, adding new ones to the poll set.
+    Raises TooManySymbols (and changes nothing) if that would exceed MAX_TRACKED.
+    """
+    wanted = [s for s in dict.fromkeys(s.upper() for s in symbols) if s != "CASH"]
+    new = [s for s in wanted if s not in _tracked]
+    if len(_tracked) + len(new) > MAX_TRACKED:
+        raise TooManySymbols(f"Quote poller is tracking the maximum of {MAX_TRACKED} symbols")
+    _tracked.extend(new)
+    for symbol in wanted:
+        _refcount[symbol] = _refcount.get(symbol, 0) + 1
+    return wanted
+
+def unsubscribe(symbols):
+    """Release one subscriber per symbol; unpinned symbols nobody watches stop polling."""
+    for symbol in symbols:
+        count = _refcount.get(symbol, 0) - 1
+        if count > 0:
+            _refcount[symbol] = count
+            continue
+        _refcount.pop(symbol, None)
+        if symbol not in _pinned and symbol in _tracked:
+            _tracked.remove(symbol)
+            _latest.pop(symbol, None)
+
+def latest_quotes(symbols=None) -> dict:
+    if symbols is None:
+        return dict(_latest)
+    return {s: _latest[s] for s in symbols if s in _latest}
+
+def _changed(old: dict, new: dict) -> bool:
+    return old is None or old['price'] != new['price'] or old['prev_close'] != new['prev_close']
+
+def _publish_tracked():
+    shared_put(("poller_tracked", WORKER_ID), list(_tracked))
+
+async def _host_tracked() -> list:
+    """Tracked symbols over every live worker (this one first, MTX first), at most MAX_TRACKED."""
+    published = await asyncio.to_thread(get_prefix, "poller_tracked", LEADER_TTL)
+    symbols = list(_tracked)
+    for other in published.values():
+        symbols.extend(other)
+    return list(dict.fromkeys(symbols))[:MAX_TRACKED]
+
+async def poll_once() -> dict:
+    """
+    Refresh every tracked symbol once and return the quotes that changed.
+    The leader fetches (for every worker's symbols); followers read its stored quotes.
+    """
+    deltas = {}
+    leader = await asyncio.to_thread(is_leader, "poller", LEADER_TTL)
+    symbols = list(_tracked)
+    if SHARED_CACHE_ENABLED:
+        await asyncio.to_thread(_publish_tracked)
+        if leader:
+            symbols = await _host_tracked()
+    load = (lambda s: fetch_quote(s, refresh=True)) if leader else (lambda s: shared_quote(s, QUOTE_TTL))
+
+    # Night-session future is the most time sensitive; refresh it before the rest
+    head, rest = symbols[:1], symbols[1:]
+    for group in (head, rest):
+        results = await asyncio.gather(*[load(s) for s in group], return_exceptions=True)
+        for symbol, quote in zip(group, results):
+            if isinstance(quote, Exception) or quote is None:
+                continue
+            if symbol not in _tracked:
+                # Another worker's symbol, or the last subscriber left while this fetch was in flight
+                continue
+            if _changed(_latest.get(symbol), quote):
+                _latest[symbol] = quote
+                deltas[symbol] = quote
+
+    if deltas:
+        publish(deltas)
+    return deltas
+
+def publish(deltas: dict):
+    for queue in list(_subscribers):
+        if queue.full():
+            # Slow client: drop its oldest pending update rather than block the poller
+            try:
+                queue.get_nowait()
+            except asyncio.QueueEmpty:
+                pass
+        queue.put_nowait(deltas)
+
+async def _run():
+    for item in get_portfolio_summary():
+        track(item.get('symbol', ''))
+    print(f"⏱️ Quote poller started ({POLL_INTERVAL}s): {', '.join(_tracked)}")
+
+    loop = asyncio.get_running_loop()
+    while True:
+        began = loop.time()
+        try:
+            await poll_once()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"⚠️ Quote poll failed: {e}")
+        # Fixed cadence: followers trail the leader's quotes by at most one interval
+        await asyncio.sleep(max(0.0, POLL_INTERVAL - (loop.time() - began)))
+
+def start_poller():
+    global _task
+    if POLLER_ENABLED and _task is None:
+        _task = asyncio.create_task(_run())
+
+async def stop_poller():
+    global _task
+    if _task is not None:
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+        _task = None
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def quote_stream(symbols=None, heartbeat: float = 15.0):
+    """
+    Server-Sent Events generator: a snapshot of the latest quotes first, then
+    only the symbols that changed on each poll.
+    Subscribed symbols are released when the client disconnects.
+    """
+    subscribed = []
+    if symbols:
+        try:
+            subscribed = subscribe(symbols)
+        except TooManySymbols as e:
+            yield _sse("error", {"detail": str(e)})
+            return
+
+    queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+    _subscribers.add(queue)
+    try:
+        yield _sse("snapshot", latest_quotes(symbols))
+        while True:
+            try:
+                deltas = await asyncio.wait_for(queue.get(), timeout=heartbeat)
+            except asyncio.TimeoutError:
+                # Comment line keeps proxies from closing an idle stream
+                yield ": keep-alive\n\n"
+                continue
+            if symbols:
+                deltas = {s: q for s, q in deltas.items() if s in symbols}
+            if deltas:
+                yield _sse("quotes", deltas)
+    finally:
+        _subscribers.discard(queue)
+        unsubscribe(subscribed)
@@ -1,46 +1,47 @@
-import json
-import os
 import uuid
+import numpy as np
 from datetime import datetime
+from core.db import cached, transaction, insert_positions, POSITION_COLUMNS
 
-# Define data path
-DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
-PORTFOLIO_FILE = os.path.join(DATA_DIR, "portfolio.json")
+# Positions live in the SQLite store (core.db); reads come from its
+# mtime-validated in-memory copy, writes are single transactions.
 
-# Ensure data directory exists
-if not os.path.exists(DATA_DIR):
-    os.makedirs(DATA_DIR)
+def _load_rows(conn):
+    rows = conn.execute(f"SELECT {', '.join(POSITION_COLUMNS)} FROM positions ORDER BY seq").fetchall()
+    return tuple(dict(row) for row in rows)
 
 def load_portfolio():
-    if not os.path.exists(PORTFOLIO_FILE):
-        return []
-    try:
-        with open(PORTFOLIO_FILE, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except:
-        return []
+    # Fresh dicts per call: enrich_positions() updates them in place
+    return [dict(p) for p in cached("positions", _load_rows)]
 
 def save_portfolio(data):
-    with open(PORTFOLIO_FILE, 'w', encoding='utf-8') as f:
-        json.dump(data, f, indent=4)
+    """Replace every position (one transaction)."""
+    with transaction() as conn:
+        conn.execute("DELETE FROM positions")
+        insert_positions(conn, data)
 
-def add_position(symbol: str, shares: float, avg_cost: float):
-    portfolio = load_portfolio()
-    new_position = {
+def _new_position(symbol: str, shares: float, avg_cost: float):
+    return {
         "id": str(uuid.uuid4()),
         "symbol": symbol.upper(),
         "shares": float(shares),
         "avg_cost": float(avg_cost),
         "created_at": datetime.now().isoformat()
     }
-    portfolio.append(new_position)
-    save_portfolio(portfolio)
-    return new_position
+
+def add_position(symbol: str, shares: float, avg_cost: float):
+    return add_positions([(symbol, shares, avg_cost)])[0]
+
+def add_positions(items: list):
+    """Bulk insert of (symbol, shares, avg_cost) tuples in one transaction."""
+    positions = [_new_position(*item) for item in items]
+    with transaction() as conn:
+        insert_positions(conn, positions)
+    return positions
 
 def delete_position(position_id: str):
-    portfolio = load_portfolio()
-    portfolio = [p for p in portfolio if p['id'] != position_id]
-    save_portfolio(portfolio)
+    with transaction() as conn:
+        conn.execute("DELETE FROM positions WHERE id = ?", (position_id,))
     return {"status": "success", "id": position_id}
 
 def get_portfolio_summary():
@@ -50,3 +51,83 @@ def get_portfolio_summary():
     this just returns the inventory.
     """
     return load_portfolio()
+
+
+# --- PNL ENRICHMENT ---
+# Apply Multiplier (Default 1)
+# MTX (Mini Taiex) = 50 TWD per point
+MULTIPLIERS = {"MTX": 50}
+# For Futures, we only count the PnL as part of the total asset value
+# to avoid skewing Net Worth with millions of notional value.
+FUTURES = {"MTX"}
+
+EMPTY_QUOTE_FIELDS = {"current_price": 0, "daily_change_pct": 0, "market_value": 0, "pnl": 0, "pnl_pct": 0}
+
+def enrich_positions(items: list, quotes: dict) -> list:
+    """
+    Add current price / daily change / market value / PnL to every position in one vectorized pass.
+    quotes: {symbol: (current_price, prev_close)}; symbols without a usable quote get zeros.
+    """
+    rows = []
+    for item in items:
+        try:
+            # Normalize keys if coming from different sources (Firebase vs Python dict)
+            symbol = item.get('symbol')
+            shares = float(item.get('shares', 0))
+            avg_cost = float(item.get('avg_cost', 0))
+        except Exception as e:
+            print(f"Error enriching {item.get('symbol')}: {e}")
+            item.update(EMPTY_QUOTE_FIELDS)
+            continue
+
+        # Special Handling for CASH
+        if symbol == "CASH":
+            item.update({
+                "current_price": 1.0,
+                "daily_change_pct": 0,
+                "market_value": round(shares, 0),
+                "pnl": 0,
+                "pnl_pct": 0
+            })
+            continue
+
+        quote = quotes.get(symbol)
+        if quote is None or not quote[1]:
+            # Fallback if no data (or a zero previous close)
+            item.update(EMPTY_QUOTE_FIELDS)
+            continue
+        rows.append((item, symbol, shares, avg_cost, quote[0], quote[1]))
+
+    if not rows:
+        return items
+
+    shares = np.array([r[2] for r in rows], dtype=float)
+    avg_cost = np.array([r[3] for r in rows], dtype=float)
+    current_price = np.array([r[4] for r in rows], dtype=float)
+    prev_close = np.array([r[5] for r in rows], dtype=float)
+    multiplier = np.array([MULTIPLIERS.get(r[1], 1) for r in rows], dtype=float)
+    is_future = np.array([r[1] in FUTURES for r in rows])
+
+    change_pct = ((current_price - prev_close) / prev_close) * 100
+
+    market_value = current_price * shares * multiplier
+    cost_basis = avg_cost * shares * multiplier
+    unrealized_pnl = np.where(is_future, (current_price - avg_cost) * shares * multiplier, market_value - cost_basis)
+    market_value = np.where(is_future, unrealized_pnl, market_value)
+
+    # Avoid division by zero
+    cost_basis_ref = avg_cost * np.abs(shares) * multiplier
+    safe_ref = np.where(cost_basis_ref != 0, cost_basis_ref, 1.0)
+    pnl_pct = np.where(cost_basis_ref != 0, (unrealized_pnl / safe_ref) * 100, 0)
+
+    columns = zip(current_price.tolist(), change_pct.tolist(), market_value.tolist(), unrealized_pnl.tolist(), pnl_pct.tolist())
+    for row, (price, chg, mv, pnl, pct) in zip(rows, columns):
+        row[0].update({
+            "current_price": round(price, 2),
+            "daily_change_pct": round(chg, 2),
+            "market_value": round(mv, 0),
+            "pnl": round(pnl, 0),
+            "pnl_pct": round(pct, 2)
+        })
+
+    return items
@@ -0,0 +1,82 @@
+import os
+import time
+import asyncio
+import pandas as pd
+from core.fetcher import SYMBOL_MAP, fetch_yahoo_quote, fetch_price_history
+from core.singleflight import coalesce
+from core.sharedcache import shared_fetch, get as shared_get
+
+# --- LIGHTWEIGHT QUOTES ---
+# Last price + previous close only. Scraped from Yahoo TW where possible
+# (MTX night session, .TW listings), otherwise the last two cached bars.
+
+QUOTE_TTL = float(os.environ.get("WEALTH_OS_QUOTE_TTL", "10"))
+# Forced refreshes (poller) still accept a quote another worker fetched this recently.
+# At least one poll interval, so every worker's poller shares one upstream call per tick
+QUOTE_REFRESH_AGE = float(os.environ.get("WEALTH_OS_QUOTE_REFRESH_AGE", os.environ.get("WEALTH_OS_POLL_INTERVAL", "5")))
+QUOTE_MAX_ENTRIES = 512
+
+# Yahoo TW quote page for symbols that are not plain .TW tickers
+QUOTE_PAGES = {
+    "MTX": "WTX%26"   # Mini-Taiex near month, includes night session
+}
+
+_quotes = {}
+
+def _quote_page(symbol: str):
+    if symbol in QUOTE_PAGES:
+        return QUOTE_PAGES[symbol]
+    ticker = SYMBOL_MAP.get(symbol.upper(), symbol)
+    return ticker if ".TW" in ticker else None
+
+def _make_quote(symbol: str, price: float, prev_close: float, source: str) -> dict:
+    change = price - prev_close
+    return {
+        "symbol": symbol,
+        "price": price,
+        "prev_close": prev_close,
+        "change": round(change, 4),
+        "change_pct": round(change / prev_close * 100, 4) if prev_close else 0,
+        "source": source,
+        "timestamp": str(pd.Timestamp.now())
+    }
+
+async def _load_quote(symbol: str):
+    page = _quote_page(symbol)
+    if page is not None:
+        scraped = await fetch_yahoo_quote(page)
+        if scraped is not None:
+            price, change = scraped
+            return _make_quote(symbol, price, price - change, "yahoo_tw")
+
+    # Fallback: last two bars (served by the price cache / local store)
+    df = await fetch_price_history(symbol, period="5d")
+    if df.empty or len(df) < 2:
+        return None
+    return _make_quote(symbol, float(df['Close'].iloc[-1]), float(df['Close'].iloc[-2]), "history")
+
+async def fetch_quote(symbol: str, refresh: bool = False):
+    """
+    Latest {price, prev_close, change, change_pct} for a symbol, or None.
+    Cached for QUOTE_TTL seconds; concurrent lookups (in any worker on the host) share one upstream call.
+    refresh=True skips the in-process copy and accepts a host-wide one only if
+    younger than QUOTE_REFRESH_AGE (used by the background poller).
+    """
+    cached = _quotes.get(symbol)
+    if not refresh and cached is not None and cached[0] > time.time():
+        return cached[1]
+
+    max_age = QUOTE_REFRESH_AGE if refresh else QUOTE_TTL
+    quote, age = await coalesce(("quote", symbol, refresh), lambda: shared_fetch(("quote", symbol), max_age, lambda: _load_quote(symbol)))
+    if quote is not None:
+        now = time.time()
+        if len(_quotes) > QUOTE_MAX_ENTRIES:
+            for key in [k for k, v in _quotes.items() if v[0] <= now]:
+                del _quotes[key]
+        _quotes[symbol] = (now + QUOTE_TTL - age, quote)
+    return quote
+
+async def shared_quote(symbol: str, max_age: float = QUOTE_TTL):
+    """Quote another worker stored host-wide within max_age, or None; never goes upstream."""
+    hit = await asyncio.to_thread(shared_get, ("quote", symbol), max_age)
+    return hit[0] if hit is not None else None
@@ -0,0 +1,149 @@
+import os
+import time
+import uuid
+import pickle
+import asyncio
+import threading
+from core.store import DATA_DIR
+from core.db import open_db, immediate
+
+# --- HOST-WIDE MARKET DATA CACHE ---
+# Second level behind each worker's in-process PriceCache / quote cache:
+# one SQLite file (WAL) shared by every gunicorn worker on the host, keyed
+# by e.g. ("history", symbol, period) or ("quote", symbol).
+# Refreshes are single-writer: a worker that misses takes a lease row for
+# the key, fetches upstream and stores the result; workers missing on the
+# same key meanwhile wait for that result instead of calling Yahoo too.
+# A lease left by a crashed worker expires after LEASE_TIMEOUT.
+# The same lease table elects one leader worker per background role (quote
+# poller, boot warm-up); the others read what the leader stores.
+# WEALTH_OS_SHARED_CACHE=0 turns the layer off (plain per-worker fetches,
+# every worker leads).
+
+SHARED_CACHE_ENABLED = os.environ.get("WEALTH_OS_SHARED_CACHE", "1") != "0"
+SHARED_CACHE_FILE = os.environ.get("WEALTH_OS_SHARED_CACHE_FILE", os.path.join(DATA_DIR, "market_cache.db"))
+# Seconds a refresh lease is honoured (longer than any upstream fetch should take)
+LEASE_TIMEOUT = float(os.environ.get("WEALTH_OS_LEASE_TIMEOUT", "30"))
+# Entries older than this are purged on write
+SHARED_CACHE_RETENTION = float(os.environ.get("WEALTH_OS_SHARED_CACHE_RETENTION", "86400"))
+WAIT_INTERVAL = 0.05
+# Identity of this worker process in leader leases
+WORKER_ID = uuid.uuid4().hex
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    stored_at REAL NOT NULL,
+    payload BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS leases (
+    key TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    expires REAL NOT NULL
+);
+"""
+
+_local = threading.local()
+_stats = {"hits": 0, "misses": 0, "refreshes": 0, "waits": 0, "lease_timeouts": 0}
+
+def _conn():
+    conn = getattr(_local, "conn", None)
+    if conn is None or _local.path != SHARED_CACHE_FILE:
+        conn = open_db(SHARED_CACHE_FILE, SCHEMA)
+        _local.conn, _local.path = conn, SHARED_CACHE_FILE
+    return conn
+
+def _key(key) -> str:
+    return ":".join(map(str, key)) if isinstance(key, tuple) else str(key)
+
+def get(key, max_age: float):
+    """(value, age in seconds) if an entry younger than max_age exists, else None."""
+    row = _conn().execute("SELECT stored_at, payload FROM entries WHERE key = ?", (_key(key),)).fetchone()
+    if row is None:
+        return None
+    age = time.time() - row['stored_at']
+    if age > max_age:
+        return None
+    return pickle.loads(row['payload']), max(age, 0.0)
+
+def put(key, value):
+    payload = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+    now = time.time()
+    with immediate(_conn()) as conn:
+        conn.execute("INSERT OR REPLACE INTO entries (key, stored_at, payload) VALUES (?, ?, ?)", (_key(key), now, payload))
+        conn.execute("DELETE FROM entries WHERE stored_at < ?", (now - SHARED_CACHE_RETENTION,))
+
+def get_prefix(prefix, max_age: float) -> dict:
+    """{key: value} for every entry under `prefix` younger than max_age."""
+    prefix = _key(prefix) + ":"
+    rows = _conn().execute("SELECT key, stored_at, payload FROM entries WHERE substr(key, 1, ?) = ? AND stored_at >= ?",
+                           (len(prefix), prefix, time.time() - max_age)).fetchall()
+    return {row['key']: pickle.loads(row['payload']) for row in rows}
+
+def try_lease(key, owner: str, ttl: float = None) -> bool:
+    """Take (or renew) the lease for `key` unless another live worker holds it."""
+    ttl = LEASE_TIMEOUT if ttl is None else ttl
+    now = time.time()
+    with immediate(_conn()) as conn:
+        row = conn.execute("SELECT owner, expires FROM leases WHERE key = ?", (_key(key),)).fetchone()
+        if row is not None and row['owner'] != owner and row['expires'] > now:
+            return False
+        conn.execute("INSERT OR REPLACE INTO leases (key, owner, expires) VALUES (?, ?, ?)", (_key(key), owner, now + ttl))
+        return True
+
+def is_leader(role: str, ttl: float) -> bool:
+    """
+    Take or renew the host-wide leadership of `role` for ttl seconds.
+    The leader must call again before ttl runs out; if it dies, another worker takes over.
+    """
+    if not SHARED_CACHE_ENABLED:
+        return True
+    return try_lease(("leader", role), WORKER_ID, ttl)
+
+def release(key, owner: str):
+    with immediate(_conn()) as conn:
+        conn.execute("DELETE FROM leases WHERE key = ? AND owner = ?", (_key(key), owner))
+
+async def shared_fetch(key, max_age: float, factory):
+    """
+    (value, age) for `key`: a host-wide entry younger than max_age, or the
+    result of `await factory()` (age 0), fetched by one worker at a time.
+    None results are returned but not stored; exceptions propagate.
+    """
+    if not SHARED_CACHE_ENABLED:
+        return await factory(), 0.0
+
+    hit = await asyncio.to_thread(get, key, max_age)
+    if hit is not None:
+        _stats["hits"] += 1
+        return hit
+    _stats["misses"] += 1
+
+    owner = uuid.uuid4().hex
+    deadline = time.time() + LEASE_TIMEOUT
+    while not await asyncio.to_thread(try_lease, key, owner):
+        # Another worker is refreshing this key: wait for its result
+        _stats["waits"] += 1
+        await asyncio.sleep(WAIT_INTERVAL)
+        hit = await asyncio.to_thread(get, key, max_age)
+        if hit is not None:
+            return hit
+        if time.time() > deadline:
+            _stats["lease_timeouts"] += 1
+            return await factory(), 0.0
+
+    try:
+        # The previous holder may have stored it between our miss and the lease
+        hit = await asyncio.to_thread(get, key, max_age)
+        if hit is not None:
+            return hit
+        _stats["refreshes"] += 1
+        value = await factory()
+        if value is not None:
+            await asyncio.to_thread(put, key, value)
+        return value, 0.0
+    finally:
+        await asyncio.to_thread(release, key, owner)
+
+def shared_cache_stats() -> dict:
+    return {"enabled": SHARED_CACHE_ENABLED, **_stats}
@@ -0,0 +1,41 @@
+import asyncio
+import pandas as pd
+
+# --- SINGLE-FLIGHT REQUEST COALESCING ---
+# Concurrent callers asking for the same key share one in-flight upstream
+# call instead of each hitting Yahoo on their own.
+
+_inflight = {}
+_stats = {"leaders": 0, "coalesced": 0}
+
+async def coalesce(key, factory):
+    """
+    Await `factory()` once per key. Callers arriving while it is still
+    running wait on the same task and receive the same result (or exception).
+    DataFrames get a shallow per-caller wrapper; the data itself is shared (Copy-on-Write).
+    """
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(factory())
+        _inflight[key] = task
+        _stats["leaders"] += 1
+
+        def _release(done, key=key):
+            if _inflight.get(key) is done:
+                del _inflight[key]
+        task.add_done_callback(_release)
+    else:
+        _stats["coalesced"] += 1
+
+    # Shield so one client disconnecting does not cancel the shared fetch
+    result = await asyncio.shield(task)
+    if isinstance(result, pd.DataFrame):
+        return result.copy(deep=False)
+    return result
+
+def singleflight_stats() -> dict:
+    return {
+        "in_flight": len(_inflight),
+        "leaders": _stats["leaders"],
+        "coalesced": _stats["coalesced"]
+    }
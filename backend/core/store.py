@@ -0,0 +1,240 @@
+import os
+import re
+import json
+import time
+import struct
+import numpy as np
+import pandas as pd
+
+# --- LOCAL PRICE STORE ---
+# Keeps every daily bar fetched so far (per resolved Yahoo ticker) on disk,
+# so we only ask upstream for the missing tail instead of the full period.
+#
+# Columnar archive, one file per ticker, opened with np.memmap:
+#   b"WOSA" | uint32 header length | JSON header | padding to 8 |
+#   (1 + columns) x rows block of 8-byte values, one contiguous row per field:
+#   row 0 = bar timestamps (int64 ns, UTC), then every column as float64 or
+#   int64 (see header "columns").
+# Frames are built on zero-copy views of the mapping: a cold load only reads
+# the header, pages come in on first touch and the OS page cache shares them
+# between workers. The mapping is copy-on-write (mode 'c'), so a caller
+# patching a bar (MTX live tick) never reaches the file.
+# Every save writes a new generation (<ticker>.<time_ns>.col) and removes the
+# older ones, so a file is never replaced while another process maps it.
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
+STORE_DIR = os.path.join(DATA_DIR, "prices")
+
+# Seconds before the stored tail is considered stale and refreshed (delta download)
+STORE_MAX_AGE = int(os.environ.get("WEALTH_OS_STORE_MAX_AGE", "900"))
+
+# yfinance-style periods expressed as calendar offsets ("Nd" periods are trading days)
+PERIOD_OFFSETS = {
+    "1mo": pd.DateOffset(months=1),
+    "3mo": pd.DateOffset(months=3),
+    "6mo": pd.DateOffset(months=6),
+    "1y": pd.DateOffset(years=1),
+    "2y": pd.DateOffset(years=2),
+    "5y": pd.DateOffset(years=5),
+    "10y": pd.DateOffset(years=10),
+}
+
+ARCHIVE_MAGIC = b"WOSA"
+
+def _safe_name(ticker: str) -> str:
+    return re.sub(r'[^A-Za-z0-9._-]', '_', ticker)
+
+def _generations(ticker: str) -> list:
+    """Archive files for a ticker, oldest first."""
+    prefix = _safe_name(ticker) + "."
+    try:
+        names = os.listdir(STORE_DIR)
+    except FileNotFoundError:
+        return []
+    found = []
+    for name in names:
+        if name.startswith(prefix) and name.endswith(".col") and name[len(prefix):-4].isdigit():
+            found.append((int(name[len(prefix):-4]), os.path.join(STORE_DIR, name)))
+    return [path for _, path in sorted(found)]
+
+def _now_like(index: pd.DatetimeIndex) -> pd.Timestamp:
+    """Current time in the same timezone as the bar index."""
+    now = pd.Timestamp.now(tz=index.tz) if index.tz is not None else pd.Timestamp.now()
+    return now.normalize()
+
+def period_start(period: str, now: pd.Timestamp):
+    """
+    First timestamp covered by a calendar period.
+    Returns None for 'max' (since inception).
+    """
+    if period == "max":
+        return None
+    if period == "ytd":
+        return now.replace(month=1, day=1)
+    if period in PERIOD_OFFSETS:
+        return now - PERIOD_OFFSETS[period]
+    raise ValueError(f"Unsupported period: {period}")
+
+def trading_days(period: str):
+    """Number of bars for 'Nd' periods (e.g. '5d' -> 5), otherwise None."""
+    match = re.fullmatch(r'(\d+)d', period)
+    return int(match.group(1)) if match else None
+
+def slice_period(df: pd.DataFrame, period: str) -> pd.DataFrame:
+    """Cut a stored frame down to what yfinance would return for `period`."""
+    if df.empty:
+        return df
+    n_days = trading_days(period)
+    if n_days is not None:
+        return df.iloc[-n_days:]
+    start = period_start(period, _now_like(df.index))
+    if start is None:
+        return df
+    # Positional slice of the sorted index: a view, not a copy
+    return df.iloc[df.index.searchsorted(start):]
+
+def write_archive(path: str, entry: dict):
+    bars = entry['bars']
+    rows, columns = [bars.index.as_unit('ns').asi8.astype('<i8')], []
+    for col in bars.columns:
+        values = bars[col]
+        if values.dtype.kind in 'iub':
+            rows.append(values.to_numpy(dtype='<i8'))
+            columns.append({"name": col, "dtype": "i8"})
+        else:
+            rows.append(pd.to_numeric(values, errors='coerce').to_numpy(dtype='<f8', na_value=np.nan))
+            columns.append({"name": col, "dtype": "f8"})
+
+    header = json.dumps({
+        "rows": len(bars),
+        "columns": columns,
+        "index_name": bars.index.name,
+        "tz": str(bars.index.tz) if bars.index.tz is not None else None,
+        "covered_period": entry.get('covered_period'),
+        "fetched_at": entry['fetched_at']
+    }).encode()
+    header += b" " * (-(len(ARCHIVE_MAGIC) + 4 + len(header)) % 8)
+    with open(path, 'wb') as f:
+        f.write(ARCHIVE_MAGIC + struct.pack("<I", len(header)) + header)
+        for values in rows:
+            f.write(np.ascontiguousarray(values).tobytes())
+
+def read_archive(path: str) -> dict:
+    """Store entry whose bars are zero-copy views of the memory-mapped file."""
+    with open(path, 'rb') as f:
+        if f.read(len(ARCHIVE_MAGIC)) != ARCHIVE_MAGIC:
+            raise ValueError("not a price archive")
+        (header_len,) = struct.unpack("<I", f.read(4))
+        header = json.loads(f.read(header_len))
+
+    n, columns = header['rows'], header['columns']
+    if n > 0:
+        block = np.memmap(path, dtype='<f8', mode='c', offset=len(ARCHIVE_MAGIC) + 4 + header_len, shape=(len(columns) + 1, n))
+    else:
+        block = np.empty((len(columns) + 1, 0))
+
+    index = pd.DatetimeIndex(block[0].view('<i8').view('M8[ns]'), name=header['index_name'])
+    if header['tz'] is not None:
+        index = index.tz_localize('UTC').tz_convert(header['tz'])
+    data = {c['name']: block[i + 1].view('<i8') if c['dtype'] == 'i8' else block[i + 1] for i, c in enumerate(columns)}
+    return {
+        "bars": pd.DataFrame(data, index=index, copy=False),
+        "covered_period": header['covered_period'],
+        "fetched_at": header['fetched_at']
+    }
+
+def load_entry(ticker: str):
+    # A newer generation may remove the file between listing and opening: list again once
+    for _ in range(2):
+        generations = _generations(ticker)
+        if not generations:
+            return None
+        try:
+            return read_archive(generations[-1])
+        except FileNotFoundError:
+            continue
+        except Exception as e:
+            print(f"⚠️ Price store unreadable for {ticker}, rebuilding: {e}")
+            return None
+    return None
+
+def save_entry(ticker: str, entry: dict):
+    os.makedirs(STORE_DIR, exist_ok=True)
+    path = os.path.join(STORE_DIR, f"{_safe_name(ticker)}.{time.time_ns()}.col")
+    # Per-process temp file: several workers may save the same ticker at once
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    write_archive(tmp_path, entry)
+    os.replace(tmp_path, path)
+    for old in _generations(ticker):
+        if old == path:
+            break
+        try:
+            os.remove(old)
+        except OSError:
+            pass  # still mapped (Windows) - removed by a later save
+
+def _merge_bars(old: pd.DataFrame, new: pd.DataFrame) -> pd.DataFrame:
+    """Append new bars, letting freshly downloaded bars overwrite stored ones."""
+    if old is None or old.empty:
+        return new
+    if new is None or new.empty:
+        return old
+    merged = pd.concat([old, new])
+    merged = merged[~merged.index.duplicated(keep='last')]
+    return merged.sort_index()
+
+def _covers(entry: dict, period: str) -> bool:
+    """Does the stored history reach back far enough for `period`?"""
+    bars = entry['bars']
+    n_days = trading_days(period)
+    if n_days is not None:
+        return len(bars) >= n_days
+    covered = entry.get('covered_period')
+    if covered is None:
+        return False
+    if covered == "max":
+        return True
+    if period == "max":
+        return False
+    now = _now_like(bars.index)
+    return period_start(covered, now) <= period_start(period, now)
+
+def get_history(ticker: str, period: str, download) -> pd.DataFrame:
+    """
+    Serve `period` bars for `ticker` from the local store.
+    `download(ticker, **kwargs)` is the upstream fetcher; it is called with
+    `period=...` for a full pull or `start=...` for the missing tail only.
+    """
+    entry = load_entry(ticker)
+
+    if entry is None or not _covers(entry, period):
+        # Cold store (or not enough history): one full pull of the requested period
+        print(f"💾 Store miss: {ticker} ({period}), full download...")
+        df = download(ticker, period=period)
+        if df.empty:
+            # Nothing new to store; fall back to whatever history we already have
+            return slice_period(entry['bars'], period) if entry else df
+        old_bars = entry['bars'] if entry else None
+        covered = period if trading_days(period) is None else (entry or {}).get('covered_period')
+        entry = {
+            "bars": _merge_bars(old_bars, df),
+            "covered_period": covered,
+            "fetched_at": time.time()
+        }
+        save_entry(ticker, entry)
+
+    elif time.time() - entry['fetched_at'] > STORE_MAX_AGE:
+        # Warm store: only ask for the tail since the last stored bar (re-fetch it, it may have been partial)
+        last_bar = entry['bars'].index[-1]
+        print(f"💾 Store delta: {ticker} since {last_bar.date()}...")
+        try:
+            tail = download(ticker, start=last_bar.strftime('%Y-%m-%d'))
+            entry['bars'] = _merge_bars(entry['bars'], tail)
+        except Exception as e:
+            # Serve stale bars rather than failing the request
+            print(f"⚠️ Delta fetch failed for {ticker}, serving stored bars: {e}")
+        entry['fetched_at'] = time.time()
+        save_entry(ticker, entry)
+
+    # Shared frame (Copy-on-Write); views of the archive mapping when loaded from disk
+    return slice_period(entry['bars'], period)
@@ -0,0 +1,139 @@
+import numpy as np
+import pandas as pd
+from core.portfolio import MULTIPLIERS, FUTURES
+
+# --- MONTE CARLO STRESS ENGINE ---
+# Simulates index paths (GBM fitted to history, or bootstrapped daily returns)
+# and revalues the enriched portfolio on every path. Each holding is mapped to
+# a daily-rebalanced multiple of the index (00631L = 2x, futures = linear in
+# points), so the portfolio only needs one growth factor per distinct beta.
+# Paths are generated in chunks: memory is bounded by STRESS_CHUNK_ELEMS, not
+# by the number of paths.
+
+# Daily index multiple per symbol (default 1x, cash 0x)
+BETAS = {"00631L": 2.0, "CASH": 0.0}
+STRESS_METHODS = ("gbm", "bootstrap")
+MAX_STRESS_PATHS = 200_000
+MAX_STRESS_HORIZON = 252
+# Upper bound on float64 elements per path block (~16 MB)
+STRESS_CHUNK_ELEMS = 2_000_000
+CONFIDENCE_LEVELS = (0.95, 0.99)
+HISTOGRAM_BINS = 50
+
+def _exposures(positions: list):
+    """
+    Enriched positions -> (betas, exposure per beta, per-position rows).
+    Futures exposure is the notional (points x multiplier), everything else its market value.
+    """
+    rows = []
+    for item in positions:
+        symbol = str(item.get('symbol', '')).upper().strip()
+        if symbol in FUTURES:
+            exposure = float(item.get('shares', 0)) * float(item.get('current_price', 0)) * MULTIPLIERS.get(symbol, 1)
+        else:
+            exposure = float(item.get('market_value', 0) or 0)
+        rows.append({"symbol": symbol, "beta": BETAS.get(symbol, 1.0), "exposure": exposure})
+
+    betas = sorted({r['beta'] for r in rows if r['beta'] != 0 and r['exposure'] != 0})
+    by_beta = np.array([sum(r['exposure'] for r in rows if r['beta'] == b) for b in betas])
+    return np.array(betas), by_beta, rows
+
+def _path_returns(rng, method: str, n: int, horizon: int, log_mu: float, log_sigma: float, history: np.ndarray) -> np.ndarray:
+    """(n, horizon) simple daily index returns."""
+    if method == "bootstrap":
+        return history[rng.integers(0, len(history), size=(n, horizon))]
+    return np.expm1(rng.normal(log_mu, log_sigma, size=(n, horizon)))
+
+def _tail(pnl: np.ndarray, level: float):
+    """VaR / CVaR as positive loss amounts at a confidence level, plus the tail mask."""
+    cutoff = np.quantile(pnl, 1 - level)
+    tail = pnl <= cutoff
+    return -cutoff, -pnl[tail].mean(), tail
+
+def run_stress_test(positions: list, index_close: pd.Series, n_paths: int = 20000, horizon: int = 20, method: str = "bootstrap", seed=None) -> dict:
+    """
+    Monte Carlo PnL distribution of the portfolio over `horizon` trading days.
+    positions: enriched rows (symbol, shares, current_price, market_value).
+    index_close: daily closes used to fit GBM or as the bootstrap sample.
+    """
+    if method not in STRESS_METHODS:
+        raise ValueError(f"Unknown method '{method}', choose from {', '.join(STRESS_METHODS)}")
+    if not 1 <= n_paths <= MAX_STRESS_PATHS:
+        raise ValueError(f"paths must be between 1 and {MAX_STRESS_PATHS}")
+    if not 1 <= horizon <= MAX_STRESS_HORIZON:
+        raise ValueError(f"horizon must be between 1 and {MAX_STRESS_HORIZON} days")
+
+    close = index_close.dropna().to_numpy(dtype=np.float64)
+    history = close[1:] / close[:-1] - 1
+    if len(history) < 20:
+        raise ValueError(f"Not enough index history: {len(history)} returns")
+    log_history = np.log1p(history)
+    log_mu, log_sigma = float(log_history.mean()), float(log_history.std(ddof=1))
+
+    betas, by_beta, rows = _exposures(positions)
+    rng = np.random.default_rng(seed)
+
+    # Per path: index growth and one growth factor per beta (daily rebalanced)
+    index_growth = np.empty(n_paths)
+    beta_growth = np.empty((n_paths, len(betas)))
+    chunk = max(1, STRESS_CHUNK_ELEMS // horizon)
+    for lo in range(0, n_paths, chunk):
+        hi = min(lo + chunk, n_paths)
+        returns = _path_returns(rng, method, hi - lo, horizon, log_mu, log_sigma, history)
+        index_growth[lo:hi] = np.prod(1 + returns, axis=1)
+        for j, beta in enumerate(betas):
+            # 1x holdings track the index exactly, no need for a second product
+            beta_growth[lo:hi, j] = index_growth[lo:hi] if beta == 1.0 else np.prod(np.maximum(1 + beta * returns, 0), axis=1)
+
+    group_pnl = (beta_growth - 1) * by_beta
+    pnl = group_pnl.sum(axis=1)
+    net_worth = sum(float(p.get('market_value', 0) or 0) for p in positions)
+
+    risk = {}
+    for level in CONFIDENCE_LEVELS:
+        var, cvar, _ = _tail(pnl, level)
+        key = f"{int(level * 100)}"
+        risk[f"var_{key}"] = round(float(var), 0)
+        risk[f"cvar_{key}"] = round(float(cvar), 0)
+
+    # Holding-level view of the worst paths at the first confidence level
+    tail = _tail(pnl, CONFIDENCE_LEVELS[0])[2]
+    tail_growth = beta_growth[tail].mean(axis=0) - 1
+
+    mean_growth = beta_growth.mean(axis=0) - 1
+    breakdown = []
+    for r in rows:
+        j = np.searchsorted(betas, r['beta'])
+        active = r['beta'] != 0 and j < len(betas) and betas[j] == r['beta']
+        breakdown.append({
+            "symbol": r['symbol'],
+            "beta": r['beta'],
+            "exposure": round(r['exposure'], 0),
+            "expected_pnl": round(float(r['exposure'] * mean_growth[j]), 0) if active else 0,
+            # Average PnL of this holding on the worst 5% of paths
+            "tail_pnl": round(float(r['exposure'] * tail_growth[j]), 0) if active else 0
+        })
+
+    counts, edges = np.histogram(pnl, bins=HISTOGRAM_BINS)
+    percentiles = [1, 5, 25, 50, 75, 95, 99]
+    pnl_pct = np.percentile(pnl, percentiles)
+    index_pct = np.percentile((index_growth - 1) * 100, percentiles)
+
+    return {
+        "method": method,
+        "paths": n_paths,
+        "horizon_days": horizon,
+        "net_worth": round(net_worth, 0),
+        "expected_pnl": round(float(pnl.mean()), 0),
+        "pnl_std": round(float(pnl.std()), 0),
+        "prob_loss": round(float((pnl < 0).mean() * 100), 2),
+        **risk,
+        "pnl_percentiles": {f"p{p}": round(float(v), 0) for p, v in zip(percentiles, pnl_pct)},
+        "index_change_percentiles": {f"p{p}": round(float(v), 2) for p, v in zip(percentiles, index_pct)},
+        "histogram": {
+            "counts": counts.tolist(),
+            "edges": np.round(edges, 0).tolist()
+        },
+        "positions": breakdown,
+        "annual_vol_percent": round(log_sigma * np.sqrt(252) * 100, 2)
+    }
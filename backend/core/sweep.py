@@ -0,0 +1,182 @@
+import math
+import numpy as np
+import pandas as pd
+from core.engine import RISK_FREE_RATE
+
+# --- PARAMETER SWEEP ENGINE ---
+# Evaluates every (strategy, MA period, leverage) combination in one go:
+# all moving averages come from a single cumulative-sum pass and each
+# metric is computed along the time axis of a (MA x leverage x bars) block.
+
+STRATEGIES = ('ma_trend', 'ma_long', 'buy_hold')
+MAX_SWEEP_CELLS = 5000
+# Upper bound on float64 elements per (MA x leverage x bars) block temporary (~32 MB each)
+SWEEP_CHUNK_ELEMS = 4_000_000
+
+def parse_range(text: str, cast=float, max_count: int = MAX_SWEEP_CELLS) -> list:
+    """
+    '10:200:10' -> [10, 20, ..., 200] (inclusive), '1,1.5,2' -> [1, 1.5, 2].
+    Raises ValueError for non-finite values or more than max_count entries,
+    before any list is built.
+    """
+    text = str(text).strip()
+    if ':' in text:
+        parts = [cast(p) for p in text.split(':')]
+        if not all(math.isfinite(p) for p in parts):
+            raise ValueError(f"Range values must be finite: {text}")
+        start, stop = parts[0], parts[1]
+        step = parts[2] if len(parts) > 2 else cast(1)
+        if step <= 0:
+            raise ValueError(f"Step must be positive: {text}")
+        span = (stop - start) / step
+        if not math.isfinite(span) or span + 1 > max_count:
+            raise ValueError(f"Range too large: {text} (max {max_count} values)")
+        count = max(int(round(span)) + 1, 0)
+        if count > max_count:
+            raise ValueError(f"Range too large: {count} values (max {max_count})")
+        return [cast(round(start + i * step, 10)) for i in range(count)]
+    values = [cast(p) for p in text.split(',') if p.strip()]
+    if not all(math.isfinite(v) for v in values):
+        raise ValueError(f"Range values must be finite: {text}")
+    if len(values) > max_count:
+        raise ValueError(f"Range too large: {len(values)} values (max {max_count})")
+    return values
+
+def moving_average_matrix(close: np.ndarray, windows: np.ndarray) -> np.ndarray:
+    """
+    All simple moving averages at once from one cumulative sum.
+    Returns shape (len(windows), len(close)); NaN until each window is full.
+    """
+    n = len(close)
+    csum = np.concatenate(([0.0], np.cumsum(close)))
+    t = np.arange(n)
+    lo = t[None, :] + 1 - windows[:, None]
+    valid = lo >= 0
+    ma = (csum[t + 1][None, :] - csum[np.where(valid, lo, 0)]) / windows[:, None]
+    ma[~valid] = np.nan
+    return ma
+
+def _signal_matrix(close: np.ndarray, ma: np.ndarray, strategy_type: str) -> np.ndarray:
+    signal = np.zeros(ma.shape)
+    if strategy_type == 'ma_trend':
+        signal[close > ma] = 1
+        signal[close < ma] = -1
+    elif strategy_type == 'ma_long':
+        signal[close > ma] = 1
+    else:
+        signal[:] = 1
+    return signal
+
+def _grid_metrics(returns: np.ndarray, signal: np.ndarray, leverages: np.ndarray, initial_capital: float):
+    """
+    returns: (bars,), signal: (ma, bars), leverages: (lev,)
+    -> CAGR / MDD / Sharpe arrays shaped (ma, lev).
+    """
+    n = len(returns)
+    prev_signal = np.empty(signal.shape)
+    prev_signal[:, 0] = np.nan
+    prev_signal[:, 1:] = signal[:, :-1]
+
+    # (ma, lev, bars)
+    strat = (returns[None, :] * prev_signal)[:, None, :] * leverages[None, :, None]
+
+    growth = 1 + strat
+    growth[np.isnan(growth)] = 1
+    equity = np.cumprod(growth, axis=-1) * initial_capital
+    cagr = ((equity[..., -1] / initial_capital) ** (365 / n) - 1) * 100
+
+    peak = np.maximum.accumulate(equity, axis=-1)
+    mdd = ((equity - peak) / peak).min(axis=-1) * 100
+
+    daily_rf = RISK_FREE_RATE / 252
+    mask = np.isnan(strat)
+    count = (~mask).sum(axis=-1)
+    filled = np.where(mask, 0, strat)
+    mean = filled.sum(axis=-1) / np.maximum(count, 1)
+    sqr = np.where(mask, 0, (strat - mean[..., None]) ** 2)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        std = np.sqrt(sqr.sum(axis=-1) / (count - 1))
+        sharpe = np.where((std != 0) & (count > 1), (mean - daily_rf) / std * (252 ** 0.5), 0)
+    return cagr, mdd, sharpe
+
+def sweep_grid(close: np.ndarray, windows: np.ndarray, levs: np.ndarray, strategies: list, initial_capital: float, start: int = 0):
+    """
+    Raw metric grids shaped (strategy, ma, leverage).
+    Bars before `start` only warm up the moving averages; metrics cover close[start:].
+    """
+    n = len(close) - start
+    returns = np.empty(n)
+    returns[0] = np.nan
+    returns[1:] = close[start + 1:] / close[start:-1] - 1
+
+    shape = (len(strategies), len(windows), len(levs))
+    cagr = np.empty(shape)
+    mdd = np.empty(shape)
+    sharpe = np.empty(shape)
+
+    # Blocks over both the MA and leverage axes keep rows x cols x bars <= SWEEP_CHUNK_ELEMS
+    cols = max(1, min(len(levs), SWEEP_CHUNK_ELEMS // max(n, 1)))
+    rows = max(1, SWEEP_CHUNK_ELEMS // max(cols * n, 1))
+    for lo in range(0, len(windows), rows):
+        hi = min(lo + rows, len(windows))
+        ma = moving_average_matrix(close, windows[lo:hi])[:, start:]
+        for k, strategy_type in enumerate(strategies):
+            signal = _signal_matrix(close[start:], ma, strategy_type)
+            for c0 in range(0, len(levs), cols):
+                c1 = min(c0 + cols, len(levs))
+                cagr[k, lo:hi, c0:c1], mdd[k, lo:hi, c0:c1], sharpe[k, lo:hi, c0:c1] = _grid_metrics(returns, signal, levs[c0:c1], initial_capital)
+
+    return cagr, mdd, sharpe
+
+def best_cell(sharpe: np.ndarray):
+    """(strategy, ma, leverage) index of the highest finite Sharpe."""
+    ranked = np.where(np.isfinite(sharpe), sharpe, -np.inf)
+    return np.unravel_index(np.argmax(ranked), sharpe.shape)
+
+def _rounded(grid: np.ndarray, digits: int = 2) -> list:
+    """Nested lists with NaN -> None so the grid is JSON safe."""
+    grid = np.round(grid, digits)
+    return np.where(np.isfinite(grid), grid, None).tolist()
+
+def run_parameter_sweep(df: pd.DataFrame, ma_periods: list, leverages: list, strategies: list, initial_capital: float = 100000) -> dict:
+    """
+    CAGR / MDD / Sharpe heatmaps over strategy x MA period x leverage.
+    Grids are indexed [strategy][ma_period][leverage].
+    """
+    strategies = [s for s in strategies if s in STRATEGIES]
+    if not strategies:
+        raise ValueError(f"No valid strategy, choose from {', '.join(STRATEGIES)}")
+    if not ma_periods or not leverages:
+        raise ValueError("ma_period and leverage ranges must not be empty")
+    cells = len(strategies) * len(ma_periods) * len(leverages)
+    if cells > MAX_SWEEP_CELLS:
+        raise ValueError(f"Sweep too large: {cells} cells (max {MAX_SWEEP_CELLS})")
+
+    windows = np.asarray(ma_periods, dtype=np.int64)
+    levs = np.asarray(leverages, dtype=np.float64)
+    if (windows < 1).any():
+        raise ValueError("ma_period must be >= 1")
+
+    close = df['Close'].to_numpy(dtype=np.float64)
+    cagr, mdd, sharpe = sweep_grid(close, windows, levs, strategies, initial_capital)
+    k, i, j = best_cell(sharpe)
+
+    return {
+        "strategies": strategies,
+        "ma_periods": windows.tolist(),
+        "leverages": levs.tolist(),
+        "cagr_percent": _rounded(cagr),
+        "mdd_percent": _rounded(mdd),
+        "sharpe_ratio": _rounded(sharpe),
+        "best": {
+            "strategy": strategies[k],
+            "ma_period": int(windows[i]),
+            "leverage": float(levs[j]),
+            "cagr_percent": round(float(cagr[k, i, j]), 2),
+            "mdd_percent": round(float(mdd[k, i, j]), 2),
+            "sharpe_ratio": round(float(sharpe[k, i, j]), 2)
+        },
+        "cells": cells,
+        "period_start": str(df.index[0].date()),
+        "period_end": str(df.index[-1].date())
+    }
@@ -0,0 +1,271 @@
+import os
+import re
+import threading
+import numpy as np
+import pandas as pd
+from collections import OrderedDict
+from core.store import DATA_DIR
+from core.pricing import implied_vol
+
+# --- IMPLIED VOLATILITY SURFACE ---
+# Option-chain snapshots (TAIFEX daily CSV export, or the same columns as
+# Parquet) are dropped into data/options/. Each trading date in a file becomes
+# one surface: all quotes are solved for IV in a single batched call, the
+# result is cached per file (path + mtime + size) until the file changes.
+
+OPTIONS_DIR = os.environ.get("WEALTH_OS_OPTIONS_DIR", os.path.join(DATA_DIR, "options"))
+SURFACE_CACHE_SIZE = 16
+# A surface older than this (calendar days) is not used for pricing
+MAX_SNAPSHOT_AGE = int(os.environ.get("WEALTH_OS_MAX_SNAPSHOT_AGE", "5"))
+RISK_FREE_RATE = 0.015
+SNAPSHOT_EXTENSIONS = (".csv", ".parquet")
+
+# TAIFEX column names -> internal names (English exports are accepted as-is)
+COLUMN_MAP = {
+    "交易日期": "date",
+    "契約": "contract",
+    "到期月份(週別)": "expiry",
+    "履約價": "strike",
+    "買賣權": "type",
+    "收盤價": "close",
+    "結算價": "settle",
+    "交易時段": "session",
+    "標的價格": "underlying",
+}
+CALL_LABELS = {"買權", "call", "c"}
+PUT_LABELS = {"賣權", "put", "p"}
+
+EXPIRY_RE = re.compile(r'^(\d{4})(\d{2})(?:([WF])(\d))?$')
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+def expiry_date(code: str):
+    """
+    TAIFEX contract month -> last trading day.
+    '202411' = 3rd Wednesday, '202411W1' = 1st Wednesday, '202411F2' = 2nd Friday.
+    Anything else is parsed as a plain date.
+    """
+    code = str(code).strip().replace(" ", "")
+    match = EXPIRY_RE.match(code)
+    if not match:
+        return pd.Timestamp(code).normalize()
+    year, month, kind, nth = match.groups()
+    weekday = 4 if kind == "F" else 2
+    nth = int(nth) if nth else 3
+    first = pd.Timestamp(year=int(year), month=int(month), day=1)
+    offset = (weekday - first.weekday()) % 7
+    return first + pd.Timedelta(days=offset + 7 * (nth - 1))
+
+class VolSurface:
+    """
+    IV smile per expiry (out-of-the-money quotes), interpolated linearly in
+    strike and linearly in total variance (iv^2 * T) across expiries.
+    Flat extrapolation beyond the quoted strikes / expiries.
+    """
+
+    def __init__(self, date: pd.Timestamp, spot: float, smiles: list):
+        self.date = date
+        self.spot = spot
+        # [(days, strikes ndarray, iv ndarray)] sorted by days
+        self.smiles = sorted(smiles, key=lambda s: s[0])
+        self.days = np.array([s[0] for s in self.smiles], dtype=np.float64)
+
+    def iv(self, strike, days):
+        """Annualised IV (decimal) at any strike / days-to-expiry, arrays broadcast."""
+        strike, days = np.broadcast_arrays(np.asarray(strike, dtype=np.float64), np.asarray(days, dtype=np.float64))
+        per_expiry = np.stack([np.interp(strike, k, v) for _, k, v in self.smiles])
+        if len(self.smiles) == 1:
+            return per_expiry[0]
+
+        t = self.days[:, None] / 365
+        total_var = per_expiry.reshape(len(self.smiles), -1) ** 2 * t
+        target = np.clip(days.ravel(), self.days[0], self.days[-1])
+        hi = np.clip(np.searchsorted(self.days, target), 1, len(self.days) - 1)
+        lo = hi - 1
+        cols = np.arange(target.size)
+        weight = (target - self.days[lo]) / (self.days[hi] - self.days[lo])
+        var = total_var[lo, cols] * (1 - weight) + total_var[hi, cols] * weight
+        return np.sqrt(var / (target / 365)).reshape(strike.shape)
+
+    def atm_iv(self, days) -> float:
+        return float(self.iv(self.spot, days))
+
+    def to_dict(self) -> dict:
+        return {
+            "date": str(self.date.date()),
+            "spot": round(self.spot, 2),
+            "expiries": [
+                {
+                    "days": int(d),
+                    "strikes": k.tolist(),
+                    "iv": np.round(v * 100, 2).tolist()
+                }
+                for d, k, v in self.smiles
+            ]
+        }
+
+# --- SNAPSHOT LOADING ---
+
+def read_snapshot(path: str) -> pd.DataFrame:
+    """Raw snapshot -> DataFrame with internal column names."""
+    if path.endswith(".parquet"):
+        # Needs pyarrow (or fastparquet); CSV works without extra packages
+        df = pd.read_parquet(path)
+    else:
+        try:
+            df = pd.read_csv(path, encoding="utf-8-sig", dtype=str)
+        except UnicodeDecodeError:
+            # TAIFEX downloads are Big5
+            df = pd.read_csv(path, encoding="cp950", dtype=str)
+    df.columns = [str(c).strip() for c in df.columns]
+    return df.rename(columns=COLUMN_MAP).rename(columns=str.lower)
+
+def _numeric(series: pd.Series) -> pd.Series:
+    return pd.to_numeric(series.astype(str).str.replace(",", "").str.strip(), errors="coerce")
+
+def _implied_spot(strike, price, T, is_call) -> float:
+    """Put-call parity at the strike where call and put are closest: S = C - P + K e^(-rT)."""
+    frame = pd.DataFrame({"strike": strike, "price": price, "call": is_call})
+    pairs = frame.pivot_table(index="strike", columns="call", values="price", aggfunc="first").dropna()
+    if pairs.empty or True not in pairs or False not in pairs:
+        return np.nan
+    gap = pairs[True] - pairs[False]
+    k = gap.abs().idxmin()
+    return float(gap[k] + k * np.exp(-RISK_FREE_RATE * T))
+
+def build_surfaces(df: pd.DataFrame) -> dict:
+    """Snapshot rows -> {trading date: VolSurface}. One implied_vol call for every quote."""
+    if "contract" in df:
+        df = df[df['contract'].astype(str).str.strip().isin(["TXO", ""]) | df['contract'].isna()]
+    if "session" in df:
+        # Regular session only (settlement is set there)
+        df = df[df['session'].astype(str).str.strip().isin(["一般", "regular"])]
+
+    kind = df['type'].astype(str).str.strip().str.lower()
+    price = _numeric(df['settle']) if "settle" in df else pd.Series(np.nan, index=df.index)
+    if "close" in df:
+        price = price.fillna(_numeric(df['close']))
+    quotes = pd.DataFrame({
+        "date": pd.to_datetime(df['date'].astype(str).str.strip(), format="mixed").dt.normalize(),
+        "expiry": df['expiry'].map(expiry_date),
+        "strike": _numeric(df['strike']),
+        "call": kind.isin(CALL_LABELS),
+        "price": price,
+        "underlying": _numeric(df['underlying']) if "underlying" in df else np.nan,
+    })
+    quotes = quotes[(kind.isin(CALL_LABELS) | kind.isin(PUT_LABELS)) & (quotes['price'] > 0) & (quotes['strike'] > 0)]
+    quotes['days'] = (quotes['expiry'] - quotes['date']).dt.days
+    quotes = quotes[quotes['days'] > 0]
+    if quotes.empty:
+        return {}
+
+    # Spot per trading date: given, or implied from parity on the nearest expiry
+    spots = {}
+    for date, day in quotes.groupby('date'):
+        spot = day['underlying'].dropna()
+        if len(spot):
+            spots[date] = float(spot.iloc[0])
+            continue
+        nearest = day[day['days'] == day['days'].min()]
+        spots[date] = _implied_spot(nearest['strike'], nearest['price'], nearest['days'].iloc[0] / 365, nearest['call'])
+    quotes['spot'] = quotes['date'].map(spots)
+    # Out-of-the-money side only: puts below spot, calls at/above
+    quotes = quotes[np.isfinite(quotes['spot']) & (quotes['call'] == (quotes['strike'] >= quotes['spot']))]
+
+    quotes['iv'] = implied_vol(
+        quotes['price'].to_numpy(), quotes['spot'].to_numpy(), quotes['strike'].to_numpy(),
+        quotes['days'].to_numpy() / 365, RISK_FREE_RATE, quotes['call'].to_numpy()
+    )
+    quotes = quotes[np.isfinite(quotes['iv'])]
+
+    surfaces = {}
+    for date, day in quotes.groupby('date'):
+        smiles = []
+        for days, smile in day.groupby('days'):
+            smile = smile.sort_values('strike').drop_duplicates('strike')
+            smiles.append((int(days), smile['strike'].to_numpy(), smile['iv'].to_numpy()))
+        surfaces[date] = VolSurface(date, spots[date], smiles)
+    return surfaces
+
+def load_snapshot(path: str) -> dict:
+    """Surfaces for one snapshot file, rebuilt only when the file changes."""
+    stat = os.stat(path)
+    key = (stat.st_mtime_ns, stat.st_size)
+    with _cache_lock:
+        entry = _cache.get(path)
+        if entry is not None and entry[0] == key:
+            _cache.move_to_end(path)
+            return entry[1]
+
+    try:
+        surfaces = build_surfaces(read_snapshot(path))
+        print(f"🌋 IV surface: {os.path.basename(path)} ({len(surfaces)} dates)")
+    except Exception as e:
+        print(f"⚠️ Option snapshot {path} unreadable: {e}")
+        surfaces = {}
+
+    with _cache_lock:
+        _cache[path] = (key, surfaces)
+        _cache.move_to_end(path)
+        while len(_cache) > SURFACE_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return surfaces
+
+def snapshot_files() -> list:
+    if not os.path.isdir(OPTIONS_DIR):
+        return []
+    return [os.path.join(OPTIONS_DIR, name) for name in sorted(os.listdir(OPTIONS_DIR)) if name.lower().endswith(SNAPSHOT_EXTENSIONS)]
+
+def snapshot_signature() -> tuple:
+    """(name, mtime, size) of every snapshot file; changes whenever a surface could."""
+    signature = []
+    for path in snapshot_files():
+        stat = os.stat(path)
+        signature.append((os.path.basename(path), stat.st_mtime_ns, stat.st_size))
+    return tuple(signature)
+
+def all_surfaces() -> dict:
+    """{date: VolSurface} across every snapshot file (later files win on duplicate dates)."""
+    surfaces = {}
+    for path in snapshot_files():
+        surfaces.update(load_snapshot(path))
+    return dict(sorted(surfaces.items()))
+
+def latest_surface():
+    """Most recent surface, or None when no snapshots are available."""
+    surfaces = all_surfaces()
+    return surfaces[max(surfaces)] if surfaces else None
+
+def current_surface(today=None):
+    """Latest surface if at most MAX_SNAPSHOT_AGE days old (for live pricing), else None."""
+    surface = latest_surface()
+    if surface is None:
+        return None
+    today = pd.Timestamp.now().normalize() if today is None else pd.Timestamp(today).normalize()
+    return surface if (today - surface.date.normalize()).days <= MAX_SNAPSHOT_AGE else None
+
+def surface_iv_series(dates, days: int, moneyness=None) -> np.ndarray:
+    """
+    IV (decimal) per date from the latest snapshot on or before it (at most
+    MAX_SNAPSHOT_AGE days old). Looked up by moneyness (strike / spot, ATM when
+    omitted) so any underlying level maps onto the surface. NaN where no surface applies.
+    """
+    dates = pd.DatetimeIndex(dates)
+    if dates.tz is not None:
+        dates = dates.tz_localize(None)
+    dates = dates.normalize()
+    result = np.full(len(dates), np.nan)
+    surfaces = all_surfaces()
+    if not surfaces or not len(dates):
+        return result
+
+    snap_dates = pd.DatetimeIndex(list(surfaces))
+    pos = snap_dates.searchsorted(dates, side="right") - 1
+    usable = (pos >= 0) & ((dates - snap_dates[np.maximum(pos, 0)]).days <= MAX_SNAPSHOT_AGE)
+    for p in np.unique(pos[usable]):
+        surface = surfaces[snap_dates[p]]
+        rows = np.flatnonzero(usable & (pos == p))
+        m = 1.0 if moneyness is None else np.asarray(moneyness, dtype=np.float64)[rows]
+        result[rows] = surface.iv(surface.spot * m, days)
+    return result
@@ -0,0 +1,183 @@
+import os
+import time
+import numpy as np
+import pandas as pd
+import multiprocessing as mp
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor
+from core.engine import signals_from_ma, backtest_kernel, equity_from_returns, drawdown_curve
+from core.sweep import STRATEGIES, MAX_SWEEP_CELLS, moving_average_matrix, sweep_grid, best_cell
+
+# --- WALK-FORWARD OPTIMIZATION ---
+# Rolling in-sample windows pick the best (strategy, MA, leverage) by Sharpe,
+# the following out-of-sample window is scored with those parameters.
+# Windows run in a process pool; the close array is placed in shared memory
+# once and every worker maps it instead of receiving a pickled copy.
+
+# Every gunicorn worker (WEB_CONCURRENCY, read by gunicorn as -w) owns a pool,
+# so each gets its share of the cores rather than all of them
+WEB_WORKERS = max(1, int(os.environ.get("WEB_CONCURRENCY", "1")))
+WF_WORKERS = int(os.environ.get("WEALTH_OS_WF_WORKERS", str(max(1, (os.cpu_count() or 1) // WEB_WORKERS))))
+MAX_WF_WINDOWS = 500
+
+_pool = None
+
+def get_pool() -> ProcessPoolExecutor:
+    """Process pool reused across requests (spawn: safe next to the fetch threads)."""
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=WF_WORKERS, mp_context=mp.get_context("spawn"))
+    return _pool
+
+def shutdown_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+def _evaluate_window(task: dict) -> dict:
+    """
+    Worker: optimise on [train_start, train_end), score on [train_end, test_end).
+    Bars before the window are used only to warm up the moving averages.
+    """
+    # Spawned workers share the parent's resource tracker, so attaching does not take ownership
+    shm = shared_memory.SharedMemory(name=task['shm_name'])
+    try:
+        close = np.ndarray((task['length'],), dtype=np.float64, buffer=shm.buf)
+        windows = np.asarray(task['ma_periods'], dtype=np.int64)
+        levs = np.asarray(task['leverages'], dtype=np.float64)
+        warmup = int(windows.max())
+
+        # 1. In-sample sweep
+        lo = max(0, task['train_start'] - warmup)
+        is_close = close[lo:task['train_end']]
+        cagr, mdd, sharpe = sweep_grid(is_close, windows, levs, task['strategies'], task['capital'], start=task['train_start'] - lo)
+        k, i, j = best_cell(sharpe)
+        strategy, ma_period, leverage = task['strategies'][k], int(windows[i]), float(levs[j])
+
+        # 2. Out-of-sample score with the chosen parameters
+        lo = max(0, task['train_end'] - 1 - ma_period)
+        oos_close = close[lo:task['test_end']]
+        ma = moving_average_matrix(oos_close, np.array([ma_period]))[0]
+        signal = signals_from_ma(oos_close, ma, strategy)
+        start = task['train_end'] - 1 - lo   # last in-sample bar = position carried into OOS
+        perf = backtest_kernel(oos_close[start:], signal[start:], leverage, task['capital'])
+
+        return {
+            "window": task['window'],
+            "best": {
+                "strategy": strategy,
+                "ma_period": ma_period,
+                "leverage": leverage
+            },
+            "in_sample": {
+                "cagr_percent": float(cagr[k, i, j]),
+                "mdd_percent": float(mdd[k, i, j]),
+                "sharpe_ratio": float(sharpe[k, i, j])
+            },
+            "out_of_sample": {
+                "cagr_percent": float(perf['cagr']),
+                "mdd_percent": float(perf['mdd']),
+                "sharpe_ratio": float(perf['sharpe']),
+                "return_pct": float((perf['final_equity'] / task['capital'] - 1) * 100)
+            },
+            "oos_returns": perf['strategy_returns'][1:]
+        }
+    finally:
+        shm.close()
+
+def _r(value, digits=2):
+    return round(value, digits) if np.isfinite(value) else None
+
+def run_walk_forward(df: pd.DataFrame, ma_periods: list, leverages: list, strategies: list, train_days: int = 504, test_days: int = 126, initial_capital: float = 100000, parallel: bool = True) -> dict:
+    """
+    Walk-forward analysis over rolling windows.
+    Returns per-window parameters and IS/OOS metrics plus the stitched OOS equity stats.
+    """
+    strategies = [s for s in strategies if s in STRATEGIES]
+    if not strategies or not ma_periods or not leverages:
+        raise ValueError("strategy, ma_period and leverage ranges must not be empty")
+    if min(ma_periods) < 1 or train_days < 2 or test_days < 1:
+        raise ValueError("ma_period must be >= 1, train_days >= 2 and test_days >= 1")
+    # Every window sweeps the full grid, so the single-sweep cap applies per window
+    cells = len(strategies) * len(ma_periods) * len(leverages)
+    if cells > MAX_SWEEP_CELLS:
+        raise ValueError(f"Grid too large: {cells} cells per window (max {MAX_SWEEP_CELLS})")
+
+    close = df['Close'].to_numpy(dtype=np.float64)
+    index = df.index
+    n = len(close)
+    starts = list(range(0, n - train_days - test_days + 1, test_days))
+    if not starts:
+        raise ValueError(f"Not enough history: {n} bars for {train_days} + {test_days} day windows")
+    if len(starts) > MAX_WF_WINDOWS:
+        raise ValueError(f"Too many windows: {len(starts)} (max {MAX_WF_WINDOWS})")
+
+    began = time.perf_counter()
+    shm = shared_memory.SharedMemory(create=True, size=close.nbytes)
+    try:
+        np.ndarray(close.shape, dtype=np.float64, buffer=shm.buf)[:] = close
+        tasks = [
+            {
+                "window": w,
+                "shm_name": shm.name,
+                "length": n,
+                "train_start": s,
+                "train_end": s + train_days,
+                "test_end": s + train_days + test_days,
+                "ma_periods": list(ma_periods),
+                "leverages": list(leverages),
+                "strategies": strategies,
+                "capital": initial_capital
+            }
+            for w, s in enumerate(starts)
+        ]
+
+        if parallel:
+            results = list(get_pool().map(_evaluate_window, tasks))
+        else:
+            results = [_evaluate_window(t) for t in tasks]
+    finally:
+        shm.close()
+        shm.unlink()
+    elapsed = time.perf_counter() - began
+
+    # Stitch the out-of-sample windows into one equity curve
+    oos_returns = np.concatenate([r.pop('oos_returns') for r in results])
+    equity = equity_from_returns(oos_returns, initial_capital)
+    oos_days = len(oos_returns)
+    oos_cagr = ((equity[-1] / initial_capital) ** (365 / oos_days) - 1) * 100
+    oos_mdd = drawdown_curve(equity).min() * 100
+
+    windows = []
+    for task, r in zip(tasks, results):
+        windows.append({
+            "window": r['window'],
+            "train_start": str(index[task['train_start']].date()),
+            "train_end": str(index[task['train_end'] - 1].date()),
+            "test_start": str(index[task['train_end']].date()),
+            "test_end": str(index[task['test_end'] - 1].date()),
+            "best": r['best'],
+            "in_sample": {k: _r(v) for k, v in r['in_sample'].items()},
+            "out_of_sample": {k: _r(v) for k, v in r['out_of_sample'].items()}
+        })
+
+    is_cagr = np.array([r['in_sample']['cagr_percent'] for r in results])
+    mean_is_cagr = float(np.nanmean(is_cagr)) if np.isfinite(is_cagr).any() else np.nan
+
+    return {
+        "windows": windows,
+        "total_windows": len(windows),
+        "train_days": train_days,
+        "test_days": test_days,
+        "oos_final_equity": round(float(equity[-1]), 0),
+        "oos_cagr_percent": _r(oos_cagr),
+        "oos_mdd_percent": _r(oos_mdd),
+        # OOS CAGR relative to the average in-sample CAGR (1.0 = no decay)
+        "walk_forward_efficiency": _r(oos_cagr / mean_is_cagr) if mean_is_cagr else None,
+        "equity_curve": equity[-100:].tolist(),
+        "workers": WF_WORKERS if parallel else 1,
+        "elapsed_seconds": round(elapsed, 3),
+        "period_start": str(index[0].date()),
+        "period_end": str(index[-1].date())
+    }
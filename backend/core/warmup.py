@@ -0,0 +1,57 @@
+import os
+import time
+import asyncio
+from core.fetcher import fetch_price_history
+from core.portfolio import get_portfolio_summary
+from core.sharedcache import is_leader
+
+# --- STARTUP WARM-UP ---
+# Right after boot, prefetch the portfolio holdings and the benchmark /
+# index series in the background, so the first dashboard load is served
+# from the price cache and local store instead of waiting on Yahoo.
+# One period long enough for every view (shorter periods are sliced from it).
+# Only one worker per host warms up (leader lease in core.sharedcache); the
+# others find the result in the host-wide cache and the local store.
+
+WARMUP_ENABLED = os.environ.get("WEALTH_OS_WARMUP", "1") != "0"
+WARMUP_PERIOD = os.environ.get("WEALTH_OS_WARMUP_PERIOD", "5y")
+WARMUP_SYMBOLS = ["0050.TW", "^TWII"]
+# Workers booting within this many seconds of a warm-up skip their own
+WARMUP_LEASE = float(os.environ.get("WEALTH_OS_WARMUP_LEASE", "600"))
+
+_task = None
+
+def warmup_symbols() -> list:
+    symbols = [str(item.get('symbol', '')).upper() for item in get_portfolio_summary()]
+    return list(dict.fromkeys(s for s in symbols + WARMUP_SYMBOLS if s and s != "CASH"))
+
+async def warm_up(symbols=None, period: str = WARMUP_PERIOD) -> dict:
+    """Fetch every symbol once; returns {symbol: bars or error}."""
+    symbols = warmup_symbols() if symbols is None else symbols
+    start = time.perf_counter()
+    results = await asyncio.gather(*[fetch_price_history(s, period=period) for s in symbols], return_exceptions=True)
+    report = {s: (f"error: {r}" if isinstance(r, BaseException) else len(r)) for s, r in zip(symbols, results)}
+    print(f"🔥 Warm-up ({period}) done in {time.perf_counter() - start:.1f}s: {report}")
+    return report
+
+async def _lead_warm_up():
+    if not await asyncio.to_thread(is_leader, "warmup", WARMUP_LEASE):
+        print("🔥 Warm-up skipped: another worker is warming the shared cache")
+        return None
+    return await warm_up()
+
+def start_warmup():
+    global _task
+    if WARMUP_ENABLED and _task is None:
+        _task = asyncio.create_task(_lead_warm_up())
+
+async def stop_warmup():
+    global _task
+    if _task is not None:
+        if not _task.done():
+            _task.cancel()
+        try:
+            await _task
+        except (asyncio.CancelledError, Exception):
+            pass
+        _task = None
@@ -1,14 +1,70 @@
-from fastapi import FastAPI, HTTPException
+import pandas as pd
+
+# Cached price frames are handed to every request as shallow copies; with
+# Copy-on-Write (default from pandas 3.0) a stray write can never reach the
+# shared data. Set here, at startup, so it does not depend on import order.
+if int(pd.__version__.split(".")[0]) < 3:
+    pd.set_option("mode.copy_on_write", True)
+
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-import json
-import os
-from core.fetcher import fetch_price_history
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import StreamingResponse
+import asyncio
+import functools
+from contextlib import asynccontextmanager
+from core.fetcher import fetch_price_history, close_http_client, setup_environment
+from core.quotes import fetch_quote
+from core.poller import start_poller, stop_poller, quote_stream, MAX_TRACKED
+from core.warmup import start_warmup, stop_warmup
+from core.cache import price_cache
+from core.singleflight import singleflight_stats
+from core.sharedcache import shared_cache_stats
+from core.indicators import indicator_stats
+from core.benchmark import parse_benchmarks, benchmark_stats, DEFAULT_BENCHMARKS
+from core.payload import ResponseFormat, render
+from core.httpcache import frame_tag, make_etag, not_modified, cache_headers, ANALYZE_MAX_AGE, SIMULATE_MAX_AGE
 from core.engine import calculate_ma_strategy, run_backtest_simulation
-from core.portfolio import get_portfolio_summary, add_position, delete_position
+from core.sweep import run_parameter_sweep, parse_range
+from core.walkforward import run_walk_forward, shutdown_pool
+from core.portfolio import get_portfolio_summary, add_position, delete_position, enrich_positions
+from core.db import load_settings, save_settings
 from pydantic import BaseModel
 from typing import List, Optional
 
-app = FastAPI(title="Wealth-OS Brain")
+try:
+    from brotli_asgi import BrotliMiddleware  # optional: brotli with gzip fallback
+except ImportError:
+    BrotliMiddleware = None
+
+# Bodies below this size are sent uncompressed
+COMPRESS_MIN_SIZE = 1000
+# Never compressed: gzip buffers chunks, which would hold back SSE events
+UNCOMPRESSED_PATHS = ("/api/stream",)
+
+class StreamSafeGZipMiddleware(GZipMiddleware):
+    """GZip fallback that passes UNCOMPRESSED_PATHS straight through (older Starlette compresses text/event-stream)."""
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"].startswith(UNCOMPRESSED_PATHS):
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One-time SSL / cache path setup, then warm the dashboard symbols in the background
+    setup_environment()
+    start_poller()
+    start_warmup()
+    yield
+    await stop_warmup()
+    await stop_poller()
+    shutdown_pool()
+    # Release pooled upstream connections on shutdown
+    await close_http_client()
+
+app = FastAPI(title="Wealth-OS Brain", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -17,14 +73,55 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress large chart_data / trade_list bodies; the SSE stream is never buffered
+if BrotliMiddleware is not None:
+    app.add_middleware(BrotliMiddleware, minimum_size=COMPRESS_MIN_SIZE, gzip_fallback=True, excluded_handlers=[f"^{p}" for p in UNCOMPRESSED_PATHS])
+else:
+    app.add_middleware(StreamSafeGZipMiddleware, minimum_size=COMPRESS_MIN_SIZE)
+
 @app.get("/")
 def home():
     return {"system": "Wealth-OS", "status": "Online"}
 
+@app.get("/api/cache/stats")
+def cache_stats():
+    """
+    Price cache counters (hits / misses / evictions), host-wide cache, request coalescing, indicator and benchmark memos, for sizing.
+    """
+    return {**price_cache.stats(), "shared": shared_cache_stats(), "singleflight": singleflight_stats(), "indicators": indicator_stats(), "benchmarks": benchmark_stats()}
+
+@app.get("/api/quote/{symbol}")
+async def get_quote(symbol: str):
+    """
+    Lightweight quote: last price, previous close and day change.
+    """
+    quote = await fetch_quote(symbol.upper())
+    if quote is None:
+        raise HTTPException(status_code=404, detail=f"No quote for {symbol}")
+    return quote
+
+@app.get("/api/stream")
+async def stream_quotes(symbols: Optional[str] = None):
+    """
+    Live quotes via Server-Sent Events.
+    Sends a snapshot first, then only changed quotes from the background poller.
+    symbols: optional comma-separated filter (polled while at least one stream watches them).
+    """
+    wanted = [s.strip().upper() for s in symbols.split(",") if s.strip()] if symbols else None
+    if wanted and len(wanted) > MAX_TRACKED:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_TRACKED} symbols per stream")
+    return StreamingResponse(
+        quote_stream(wanted),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.get("/api/analyze/{symbol}")
-async def analyze_asset(symbol: str, ma_short: int = 20, ma_long: int = 60):
+async def analyze_asset(request: Request, response: Response, symbol: str, ma_short: int = 20, ma_long: int = 60, format: ResponseFormat = "json"):
     """
     Monitor Mode: Get real-time status of an asset.
+    format=columnar|binary returns chart_data as parallel arrays (core.payload).
+    ETag follows the last bar (incl. live tick); If-None-Match hits skip the engine.
     """
     try:
         # Special Handling for CASH
@@ -46,19 +143,28 @@ async def analyze_asset(symbol: str, ma_short: int = 20, ma_long: int = 60):
 
         # Fetch 6 months data to ensure MA calculation is accurate
         df = await fetch_price_history(symbol, period="6mo")
-        result = calculate_ma_strategy(df, short_ma=ma_short, long_ma=ma_long)
+        etag = make_etag("analyze", symbol.upper(), frame_tag(df), ma_short, ma_long, format)
+        cached = not_modified(request, etag, ANALYZE_MAX_AGE)
+        if cached is not None:
+            return cached
+
+        result = calculate_ma_strategy(df, short_ma=ma_short, long_ma=ma_long, symbol=symbol.upper(), columnar=format != "json")
         result['symbol'] = symbol.upper()
-        return result
+        return cache_headers(render(result, format), response, etag, ANALYZE_MAX_AGE)
     except Exception as e:
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/simulate/{symbol}")
-async def simulate_strategy(symbol: str, strategy: str = 'ma_trend', capital: float = 1000000, ma_period: int = 60, leverage: float = 1.0, period: str = "5y"):
+async def simulate_strategy(request: Request, response: Response, symbol: str, strategy: str = 'ma_trend', capital: float = 1000000, ma_period: int = 60, leverage: float = 1.0, period: str = "5y", format: ResponseFormat = "json", analytics: bool = False, rolling_window: int = 63, benchmarks: str = ",".join(DEFAULT_BENCHMARKS)):
     """
     Lab Mode: Run a quick backtest.
     Includes comparison against 0050.TW (Benchmark)
+    benchmarks: comma-separated symbols (e.g. 0050,^TWII,TQQQ), each aligned to the strategy dates;
+    the first one also fills benchmark_cagr / benchmark_mdd (0 if it failed, see benchmark_errors).
+    format=columnar|binary returns equity_curve / trade_list as parallel arrays.
+    analytics=true adds monthly returns, rolling Sharpe / Sortino / volatility and the underwater curve.
     """
     try:
         # Fetch target and benchmark data
@@ -68,12 +174,24 @@ async def simulate_strategy(symbol: str, strategy: str = 'ma_trend', capital: fl
         # 2. MTX (^TWII) in yfinance often has limited history or bad ticks
         # 3. Ensures 10Y+ Data availability
         fetch_symbol = "0050.TW" if symbol == "MTX" else symbol
-        
-        df = await fetch_price_history(fetch_symbol, period=period)
-        try:
-            benchmark_df = await fetch_price_history("0050.TW", period=period)
-        except:
-            benchmark_df = None
+        benchmark_symbols = parse_benchmarks(benchmarks)
+
+        # Target and benchmarks are fetched concurrently; a benchmark that fails is reported, not fatal
+        frames = await asyncio.gather(
+            fetch_price_history(fetch_symbol, period=period),
+            *(fetch_price_history(b, period=period) for b in benchmark_symbols),
+            return_exceptions=True
+        )
+        df = frames[0]
+        if isinstance(df, BaseException):
+            raise df
+        benchmark_frames = {b: None if isinstance(f, BaseException) else f for b, f in zip(benchmark_symbols, frames[1:])}
+        fetch_errors = {b: str(f) or type(f).__name__ for b, f in zip(benchmark_symbols, frames[1:]) if isinstance(f, BaseException)}
+
+        etag = make_etag("simulate", symbol.upper(), frame_tag(df), [(b, frame_tag(f)) for b, f in benchmark_frames.items()], strategy, capital, ma_period, leverage, format, analytics, rolling_window)
+        cached = not_modified(request, etag, SIMULATE_MAX_AGE)
+        if cached is not None:
+            return cached
             
         result = run_backtest_simulation(
             df, 
@@ -81,32 +199,111 @@ async def simulate_strategy(symbol: str, strategy: str = 'ma_trend', capital: fl
             strategy_type=strategy, 
             ma_period=ma_period, 
             leverage=leverage,
-            benchmark_df=benchmark_df
+            benchmarks=benchmark_frames,
+            symbol=fetch_symbol,
+            columnar=format != "json",
+            analytics=analytics,
+            rolling_window=rolling_window
         )
+        if fetch_errors:
+            result['benchmark_errors'] = {**result.get('benchmark_errors', {}), **fetch_errors}
+        result['symbol'] = symbol.upper()
+        return cache_headers(render(result, format), response, etag, SIMULATE_MAX_AGE)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/simulate/sweep/{symbol}")
+async def sweep_strategy(symbol: str, ma_period: str = "10:200:10", leverage: str = "1,1.5,2", strategy: str = "ma_trend,ma_long", capital: float = 1000000, period: str = "5y"):
+    """
+    Lab Mode: Parameter sweep heatmap.
+    Ranges are 'start:stop:step' (inclusive) or comma lists, e.g. ma_period=20:120:20&leverage=1,2.
+    One data fetch; every (strategy, MA, leverage) cell evaluated as one array operation.
+    """
+    try:
+        ma_periods = parse_range(ma_period, int)
+        leverages = parse_range(leverage, float)
+        strategies = [s.strip() for s in strategy.split(",") if s.strip()]
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        # Same 0050.TW proxy for MTX as the single backtest
+        fetch_symbol = "0050.TW" if symbol == "MTX" else symbol
+        df = await fetch_price_history(fetch_symbol, period=period)
+        # CPU-heavy: keep the event loop free while the grid is evaluated
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(None, functools.partial(
+            run_parameter_sweep, df, ma_periods, leverages, strategies, initial_capital=capital
+        ))
         result['symbol'] = symbol.upper()
         return result
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/simulate/walkforward/{symbol}")
+async def walk_forward_strategy(symbol: str, ma_period: str = "10:200:10", leverage: str = "1,1.5,2", strategy: str = "ma_trend,ma_long", train_days: int = 504, test_days: int = 126, capital: float = 1000000, period: str = "10y"):
+    """
+    Lab Mode: Walk-forward optimization.
+    Each in-sample window (train_days bars) picks the best parameters by Sharpe,
+    the next test_days bars are scored out-of-sample. Windows run on a process pool.
+    """
+    try:
+        ma_periods = parse_range(ma_period, int)
+        leverages = parse_range(leverage, float)
+        strategies = [s.strip() for s in strategy.split(",") if s.strip()]
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        fetch_symbol = "0050.TW" if symbol == "MTX" else symbol
+        df = await fetch_price_history(fetch_symbol, period=period)
+        # CPU-heavy: keep the event loop free while the pool works
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(None, functools.partial(
+            run_walk_forward, df, ma_periods, leverages, strategies,
+            train_days=train_days, test_days=test_days, initial_capital=capital
+        ))
+        result['symbol'] = symbol.upper()
+        return result
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/simulate/options/{symbol}")
-async def simulate_options_strategy(symbol: str, period: str = "1y", initial_capital: float = 100000.0):
+async def simulate_options_strategy(request: Request, response: Response, symbol: str, period: str = "1y", initial_capital: float = 100000.0, format: ResponseFormat = "json"):
     """
     Simulate Options Volatility Strategy (Long Straddle vs Short Strangle)
     based on HV regime.
     """
     try:
         from core.options_engine import run_vol_backtest
+        from core.volsurface import snapshot_signature
         
         # 1. Fetch History
         fetch_symbol = "0050.TW" if symbol == "MTX" else symbol
         df = await fetch_price_history(fetch_symbol, period=period)
+
+        # IV snapshots feed the leg pricing, so they are part of the validator too
+        etag = make_etag("options", symbol, frame_tag(df), initial_capital, format, snapshot_signature())
+        cached = not_modified(request, etag, SIMULATE_MAX_AGE)
+        if cached is not None:
+            return cached
         
         # 2. Run Vol Backtest
-        result = run_vol_backtest(df, initial_capital=initial_capital)
+        result = run_vol_backtest(df, initial_capital=initial_capital, symbol=fetch_symbol, columnar=format != "json")
         result['symbol'] = symbol
-        return result
+        return cache_headers(render(result, format), response, etag, SIMULATE_MAX_AGE)
         
     except Exception as e:
         import traceback
@@ -135,78 +332,22 @@ async def get_portfolio(positions: Optional[List[dict]] = None, enrich_only: boo
         # Fallback to local storage (or empty if migrating)
         items = get_portfolio_summary()
 
-    enriched_items = []
-    for item in items:
-        try:
-            # Normalize keys if coming from different sources (Firebase vs Python dict)
-            symbol = item.get('symbol')
-            shares = float(item.get('shares', 0))
-            avg_cost = float(item.get('avg_cost', 0))
-            
-            # Special Handling for CASH
-            if symbol == "CASH":
-                item.update({
-                    "current_price": 1.0,
-                    "daily_change_pct": 0,
-                    "market_value": round(shares, 0),
-                    "pnl": 0,
-                    "pnl_pct": 0
-                })
-                enriched_items.append(item)
-                continue
-
-            # Fetch real-time data (small period for speed)
-            df = await fetch_price_history(symbol, period="5d")
-            
-            if not df.empty and len(df) >= 2:
-                latest = df.iloc[-1]
-                prev = df.iloc[-2]
-                
-                current_price = float(latest['Close'])
-                prev_close = float(prev['Close'])
-                change_pct = ((current_price - prev_close) / prev_close) * 100
-                
-                # Apply Multiplier (Default 1)
-                # MTX (Mini Taiex) = 50 TWD per point
-                MULTIPLIERS = { "MTX": 50 }
-                multiplier = MULTIPLIERS.get(symbol, 1)
-
-                if symbol == "MTX":
-                    # For Futures, we only count the PnL as part of the total asset value
-                    # to avoid skewing Net Worth with millions of notional value.
-                    unrealized_pnl = (current_price - avg_cost) * shares * 50
-                    market_value = unrealized_pnl
-                else:
-                    market_value = current_price * shares * multiplier
-                    cost_basis = avg_cost * shares * multiplier
-                    unrealized_pnl = market_value - cost_basis
-                
-                # Avoid division by zero
-                cost_basis_ref = avg_cost * abs(shares) * multiplier
-                pnl_pct = (unrealized_pnl / cost_basis_ref) * 100 if cost_basis_ref != 0 else 0
-                
-                item.update({
-                    "current_price": round(current_price, 2),
-                    "daily_change_pct": round(change_pct, 2),
-                    "market_value": round(market_value, 0),
-                    "pnl": round(unrealized_pnl, 0),
-                    "pnl_pct": round(pnl_pct, 2)
-                })
-            else:
-                # Fallback if no data
-                item.update({
-                    "current_price": 0, "daily_change_pct": 0, "market_value": 0, "pnl": 0, "pnl_pct": 0
-                })
-                
-        except Exception as e:
-            print(f"Error enriching {item.get('symbol')}: {e}")
-            item.update({
-                "current_price": 0, "daily_change_pct": 0, "market_value": 0, "pnl": 0, "pnl_pct": 0
-            })
-        
-        enriched_items.append(item)
-        
-    return enriched_items
+    return await enrich_with_quotes(items)
+
+async def enrich_with_quotes(items: list) -> list:
+    # Fetch real-time quotes (last price + previous close) for all symbols at once
+    symbols = sorted({item.get('symbol') for item in items if item.get('symbol') and item.get('symbol') != "CASH"})
+    results = await asyncio.gather(*[fetch_quote(symbol) for symbol in symbols], return_exceptions=True)
+
+    quotes = {}
+    for symbol, quote in zip(symbols, results):
+        if isinstance(quote, Exception):
+            print(f"Error enriching {symbol}: {quote}")
+            continue
+        if quote is not None:
+            quotes[symbol] = (quote['price'], quote['prev_close'])
+
+    return enrich_positions(items, quotes)
 
 # @app.post("/api/portfolio")
 # def add_portfolio_item(item: PositionRequest):
@@ -216,44 +357,78 @@ async def get_portfolio(positions: Optional[List[dict]] = None, enrich_only: boo
 def remove_portfolio_item(position_id: str):
     return delete_position(position_id)
 
+@app.api_route("/api/stress", methods=["GET", "POST"])
+async def stress_portfolio(positions: Optional[List[dict]] = None, paths: int = 20000, horizon: int = 20, method: str = "bootstrap", index: str = "TAIEX", period: str = "5y", seed: Optional[int] = None):
+    """
+    Monte Carlo stress test of the portfolio (POSTed positions or local storage).
+    Index paths: GBM fitted to, or daily returns bootstrapped from, the `index` history.
+    Returns the PnL distribution with VaR / CVaR (95 / 99).
+    """
+    try:
+        items = positions if positions else get_portfolio_summary()
+        enriched, history = await asyncio.gather(
+            enrich_with_quotes(items),
+            fetch_price_history(index, period=period)
+        )
+        from core.stress import run_stress_test
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(None, functools.partial(
+            run_stress_test, enriched, history['Close'],
+            n_paths=paths, horizon=horizon, method=method, seed=seed
+        ))
+        result['index'] = index.upper()
+        return result
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.get("/api/options")
 async def get_options_data():
     """
     Advisor Mode: Get nearest OTM Put prices for hedging.
     """
     try:
-        # Get latest index price first
-        df = await fetch_price_history("MTX", period="1d")
-        if df.empty:
+        # Get latest index price first (quote path, no history frame needed)
+        quote = await fetch_quote("MTX")
+        if quote is None:
             raise ValueError("Could not fetch index price")
         
-        index_price = float(df['Close'].iloc[-1])
+        index_price = float(quote['price'])
         from core.fetcher import fetch_options_summary
         data = await fetch_options_summary(index_price)
         return {**data, "index_price": index_price}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/options/surface")
+async def get_vol_surface():
+    """
+    Latest implied-volatility surface built from the option-chain snapshots in data/options.
+    """
+    from core.volsurface import latest_surface
+    surface = await asyncio.get_running_loop().run_in_executor(None, latest_surface)
+    if surface is None:
+        raise HTTPException(status_code=404, detail="No option-chain snapshots found")
+    return surface.to_dict()
+
 # --- SETTINGS API ---
-SETTINGS_FILE = "data/sim_settings.json"
+# Stored in the SQLite store (core.db) next to the portfolio
 
 @app.get("/api/settings")
 def get_settings():
-    if not os.path.exists(SETTINGS_FILE):
-        return {}
     try:
-        with open(SETTINGS_FILE, "r", encoding="utf-8") as f:
-            return json.load(f)
+        return load_settings()
     except Exception as e:
         print(f"Error loading settings: {e}")
         return {}
 
 @app.post("/api/settings")
-async def save_settings(settings: dict):
+def save_sim_settings(settings: dict):
     try:
-        os.makedirs(os.path.dirname(SETTINGS_FILE), exist_ok=True)
-        with open(SETTINGS_FILE, "w", encoding="utf-8") as f:
-            json.dump(settings, f, indent=4)
+        save_settings(settings)
         return {"status": "success"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
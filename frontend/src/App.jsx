@@ -110,7 +110,7 @@ function App() {
         try {
             setLoading(true);
             setError(null);
-            const res = await fetch(`${API_URL}/api/analyze/${selectedAsset}?t=${Date.now()}`);
+            const res = await fetch(`${API_URL}/api/analyze/${selectedAsset}`);
             if (!res.ok) throw new Error("Backend Error");
             const json = await res.json();
             setMonitorData(json);
@@ -125,31 +125,35 @@ function App() {
     // State for Syncing
     const [isSyncing, setIsSyncing] = useState(false);
 
-    // Sync Effect: Poll Backend every 10s if Sync is ON
+    // Sync Effect: Subscribe to the backend quote stream (MTX) if Sync is ON
     useEffect(() => {
         if (!isSyncing) return;
 
-        const syncData = async () => {
+        const applyQuote = (quotes) => {
+            const mtx = quotes && quotes.MTX;
+            if (mtx && mtx.price) {
+                setSimOptions(prev => ({
+                    ...prev,
+                    index_price: Math.round(mtx.price)
+                }));
+            }
+        };
+
+        // Server pushes a snapshot first, then only changed quotes
+        const source = new EventSource(`${API_URL}/api/stream?symbols=MTX`);
+        const onMessage = (e) => {
             try {
-                const res = await fetch(`${API_URL}/api/options`);
-                if (res.ok) {
-                    const data = await res.json();
-                    if (data.index_price) {
-                        setSimOptions(prev => ({
-                            ...prev,
-                            index_price: Math.round(data.index_price)
-                        }));
-                    }
-                }
-            } catch (e) {
-                console.error("Sync Failed:", e);
-                // Don't turn off, just retry next time
+                applyQuote(JSON.parse(e.data));
+            } catch (err) {
+                console.error("Sync Failed:", err);
             }
         };
+        source.addEventListener('snapshot', onMessage);
+        source.addEventListener('quotes', onMessage);
+        // EventSource reconnects on its own; don't turn off, just log
+        source.onerror = () => console.warn("Quote stream interrupted, reconnecting...");
 
-        syncData(); // Initial call
-        const interval = setInterval(syncData, 10000);
-        return () => clearInterval(interval);
+        return () => source.close();
     }, [isSyncing]);
 
     // Firebase: Load Portfolio
@@ -206,7 +210,7 @@ function App() {
             setLoading(true);
             setLabData(null);
             const targetSymbol = customSymbol.trim() || selectedAsset;
-            const res = await fetch(`${API_URL}/api/simulate/${targetSymbol}?strategy=${strategy}&ma_period=${maPeriod}&leverage=${leverage}&period=${period}&t=${Date.now()}`);
+            const res = await fetch(`${API_URL}/api/simulate/${targetSymbol}?strategy=${strategy}&ma_period=${maPeriod}&leverage=${leverage}&period=${period}`);
             if (!res.ok) throw new Error("Simulation Failed");
             const json = await res.json();
             setLabData(json);
@@ -359,8 +363,30 @@ function App() {
     useEffect(() => {
         if (activeTab === 'monitor') {
             fetchMonitorData();
-            const interval = setInterval(fetchMonitorData, 10000);
-            return () => clearInterval(interval);
+            // Live price comes from the quote stream; full analysis refresh is slow cadence
+            const interval = setInterval(fetchMonitorData, 60000);
+            if (selectedAsset === 'CASH') return () => clearInterval(interval);
+
+            const source = new EventSource(`${API_URL}/api/stream?symbols=${selectedAsset}`);
+            const onQuote = (e) => {
+                try {
+                    const quote = JSON.parse(e.data)[selectedAsset];
+                    if (!quote) return;
+                    setMonitorData(prev => prev && prev.symbol === selectedAsset ? {
+                        ...prev,
+                        price: Math.round(quote.price * 100) / 100,
+                        direct_change: quote.change
+                    } : prev);
+                } catch (err) {
+                    console.error("Quote stream parse failed:", err);
+                }
+            };
+            source.addEventListener('snapshot', onQuote);
+            source.addEventListener('quotes', onQuote);
+            return () => {
+                clearInterval(interval);
+                source.close();
+            };
         } else if (activeTab === 'lab') {
             fetchLabData();
         } else if (activeTab === 'portfolio') {